@@ -0,0 +1,176 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+LOCAL_TIMEOUT = 5
+LOCAL_KEYS = (
+    'views.decorators.cache.cache_page.',
+    'views.decorators.cache.cache_header.',
+    'post_card:',
+)
+
+
+class TieredCache(BaseCache):
+    """Небольшой LRU в памяти процесса перед общим кешем.
+
+    LOCATION — имя другого кеша из CACHES. Локально, не дольше
+    LOCAL_TIMEOUT секунд, хранятся только ключи с префиксами из
+    LOCAL_KEYS: значения, которые не меняются под тем же ключом или
+    сверяются с версиями. Версии, блокировки и счётчики всегда читаются
+    из общего кеша, поэтому сброс версии виден всем процессам сразу.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._location = location
+        self._local_timeout = options.get('LOCAL_TIMEOUT', LOCAL_TIMEOUT)
+        self._local_keys = tuple(options.get('LOCAL_KEYS', LOCAL_KEYS))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {'local': 0, 'shared': 0}
+        self.misses = {'local': 0, 'shared': 0}
+
+    @property
+    def shared(self):
+        return caches[self._location]
+
+    def _is_local(self, key):
+        return key.startswith(self._local_keys)
+
+    def _name(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _get_local(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(name)
+                self.hits['local'] += 1
+                return entry[0]
+            self._entries.pop(name, None)
+            self.misses['local'] += 1
+        return None
+
+    def _set_local(self, name, value, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        if timeout is not None and timeout <= 0:
+            return self._forget(name)
+        lifetime = self._local_timeout
+        if timeout is not None:
+            lifetime = min(lifetime, timeout)
+        # Храним копию, чтобы процесс не правил общий объект ответа.
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._entries[name] = (pickled, time.monotonic() + lifetime)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _forget(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def _count_shared(self, found):
+        with self._lock:
+            self.hits['shared'] += found
+            self.misses['shared'] += not found
+
+    def get(self, key, default=None, version=None):
+        if self._is_local(key):
+            name = self._name(key, version)
+            pickled = self._get_local(name)
+            if pickled is not None:
+                return pickle.loads(pickled)
+        missing = object()
+        value = self.shared.get(key, missing, version=version)
+        self._count_shared(value is not missing)
+        if value is missing:
+            return default
+        if self._is_local(key):
+            self._set_local(name, value, self._local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, remote = {}, []
+        for key in keys:
+            pickled = None
+            if self._is_local(key):
+                pickled = self._get_local(self._name(key, version))
+            if pickled is None:
+                remote.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+        if remote:
+            fetched = self.shared.get_many(remote, version=version)
+            for key in remote:
+                self._count_shared(key in fetched)
+                if key in fetched and self._is_local(key):
+                    self._set_local(
+                        self._name(key, version), fetched[key],
+                        self._local_timeout
+                    )
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        if self._is_local(key):
+            self._set_local(self._name(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if self._is_local(key) and key not in failed:
+                self._set_local(self._name(key, version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._forget(self._name(key, version))
+        return self.shared.add(key, value, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        return self.shared.incr(key, delta, version=version)
+
+    def has_key(self, key, version=None):
+        return self.shared.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        self._forget(self._name(key, version))
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._forget(self._name(key, version))
+        return self.shared.delete_many(keys, version=version)
+
+    def forget(self, key, version=None):
+        """Забывает локальную копию: следующее чтение пойдёт в общий кеш."""
+        self._forget(self._name(key, version))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        return self.shared.clear()
+
+    def stats(self):
+        """Попадания и промахи каждого уровня в этом процессе."""
+        return {
+            tier: {
+                'hits': self.hits[tier],
+                'misses': self.misses[tier],
+                'hit_rate': (
+                    self.hits[tier] / (self.hits[tier] + self.misses[tier])
+                    if self.hits[tier] + self.misses[tier] else 0
+                ),
+            }
+            for tier in ('local', 'shared')
+        }
@@ -0,0 +1,74 @@
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление сделало больше запросов к базе, чем ему отведено."""
+
+
+def budget_action():
+    """Что делать при превышении бюджета: 'raise', 'log' или None (не
+    считать запросы вовсе). По умолчанию при DEBUG — падать, иначе
+    писать предупреждение в лог."""
+    default = 'raise' if settings.DEBUG else 'log'
+    return getattr(settings, 'QUERY_BUDGET_ACTION', default)
+
+
+@contextmanager
+def exempt():
+    """Запросы внутри блока не считаются в бюджет представления: так
+    выполняется фоновая работа, которой пришлось идти в самом запросе."""
+    depth = getattr(_local, 'exempt', 0)
+    _local.exempt = depth + 1
+    try:
+        yield
+    finally:
+        _local.exempt = depth
+
+
+def query_budget(limit):
+    """Ограничивает число SQL-запросов за вызов представления.
+
+    Считаются все запросы, сделанные, пока работает представление,
+    включая рендер шаблона. Бюджет виден в атрибуте query_budget
+    обёртки, по нему тесты находят представления без бюджета.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            action = budget_action()
+            if action is None:
+                return view(request, *args, **kwargs)
+            queries = []
+
+            def count(execute, sql, params, many, context):
+                if not getattr(_local, 'exempt', 0):
+                    queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                response = view(request, *args, **kwargs)
+            if len(queries) > limit:
+                message = (
+                    f'{view.__module__}.{view.__name__}: {len(queries)} '
+                    f'запросов при бюджете {limit} ({request.path})'
+                )
+                if action == 'raise':
+                    raise QueryBudgetExceeded(
+                        '\n'.join([message, *queries])
+                    )
+                logger.warning(message)
+            return response
+
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
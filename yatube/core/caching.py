@@ -0,0 +1,293 @@
+import atexit
+import math
+import random
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_cache_key, learn_cache_key
+
+VERSION_KEY = 'version:{}'
+STATS_KEY = 'stats:{}:{}:{}'
+STATS_GROUPS = ('anon', 'auth')
+PAGE_PREFIXES = []
+HOLE = '<!--donut:{}-->'
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+# Коэффициент досрочного пересчёта (XFetch): чем больше, тем раньше.
+EARLY_RECOMPUTE_BETA = 1.0
+# Как часто, в секундах, процесс сбрасывает накопленные попадания в кеш.
+HITS_FLUSH_INTERVAL = 10
+
+_hits = Counter()
+_hits_lock = threading.Lock()
+_hits_flushed = time.monotonic()
+
+
+def get_versions(scopes, timeout=None):
+    """Текущие версии областей кеша; недостающие заводятся заново.
+
+    Новая версия живёт timeout секунд: страницы, закешированные с ней,
+    столько же. Если версия истекла, страницы просто пересчитаются, а
+    ключи, заведённые для несуществующих страниц, не копятся в кеше.
+    """
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Уникальное начальное значение: вытесненная из кеша версия
+            # не должна совпасть с версией старых страниц.
+            cache.add(key, time.time_ns(), timeout)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+def bump_versions(*scopes):
+    """Делает устаревшими все страницы, зависящие от этих областей.
+
+    Области без версии в кеше пропускаются: страниц с их версией нет,
+    а при следующем чтении версия заведётся заново.
+    """
+    for scope in set(scopes):
+        try:
+            cache.incr(VERSION_KEY.format(scope))
+        except ValueError:
+            pass
+
+
+def store(key, value, timeout, delta=0):
+    """Кладёт значение вместе со временем его расчёта и сроком жизни.
+
+    Физически запись живёт на LOCK_TIMEOUT дольше: после истечения
+    срока её ещё можно отдать, пока один процесс её пересчитывает.
+    """
+    cache.set(
+        key, (value, delta, time.time() + timeout), timeout + LOCK_TIMEOUT
+    )
+
+
+def _expired(delta, expires, beta):
+    # XFetch: чем дороже пересчёт, тем раньше срока кто-то один
+    # случайно решит обновить значение, пока остальные читают старое.
+    jitter = delta * beta * math.log(1 - random.random())
+    return time.time() - jitter >= expires
+
+
+def _usable(entry, is_fresh, beta):
+    value, delta, expires = entry
+    fresh = is_fresh is None or is_fresh(value)
+    return fresh and not _expired(delta, expires, beta)
+
+
+def _wait_for(key, lock):
+    """Ждёт значение, пока его считает держатель блокировки."""
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None or cache.get(lock) is None:
+            return entry
+    return None
+
+
+def fetch(key, compute, timeout, is_fresh=None, cacheable=None,
+          beta=EARLY_RECOMPUTE_BETA):
+    """Значение из кеша с защитой от лавины пересчётов.
+
+    Пересчитывает значение не более одного процесса: тот, кто захватил
+    блокировку через `cache.add`. Остальные получают старое значение, а
+    при полном промахе ждут, пока оно появится. `is_fresh(value)`
+    позволяет объявить значение устаревшим раньше срока, `cacheable`
+    отсекает значения, которые не нужно сохранять.
+    """
+    entry = cache.get(key)
+    if entry is not None and _usable(entry, is_fresh, beta):
+        return entry[0]
+    if entry is not None and hasattr(cache, 'forget'):
+        # Копия из памяти процесса могла устареть, а свежее значение
+        # уже посчитал другой процесс: перечитываем из общего кеша.
+        cache.forget(key)
+        entry = cache.get(key)
+        if entry is not None and _usable(entry, is_fresh, beta):
+            return entry[0]
+    lock = f'lock:{key}'
+    locked = cache.add(lock, True, LOCK_TIMEOUT)
+    if not locked:
+        if entry is None:
+            entry = _wait_for(key, lock)
+        if entry is not None:
+            return entry[0]
+    try:
+        started = time.monotonic()
+        value = compute()
+        if cacheable is None or cacheable(value):
+            store(key, value, timeout, time.monotonic() - started)
+    finally:
+        if locked:
+            cache.delete(lock)
+    return value
+
+
+def _cacheable_response(response):
+    return response.status_code == 200 and not (
+        response.streaming or response.cookies
+    )
+
+
+def render_hole(template_name, context, request):
+    return render_to_string(template_name, context, request)
+
+
+def fill_holes(response, holes, request):
+    """Собирает ответ из общей страницы и персональных фрагментов.
+
+    Закешированный ответ не меняется: возвращается его копия.
+    """
+    content = response.content.decode(response.charset)
+    for index, (template_name, context) in enumerate(holes):
+        content = content.replace(
+            HOLE.format(index), render_hole(template_name, context, request)
+        )
+    filled = HttpResponse(content, status=response.status_code)
+    for header, value in response.items():
+        filled[header] = value
+    return filled
+
+
+def flush_hits():
+    """Переносит накопленные процессом попадания и промахи в кеш."""
+    global _hits_flushed
+    with _hits_lock:
+        counts = dict(_hits)
+        _hits.clear()
+        _hits_flushed = time.monotonic()
+    for key, count in counts.items():
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            if not cache.add(key, count, None):
+                cache.incr(key, count)
+
+
+def count_hit(key_prefix, request, outcome):
+    """Учитывает попадание или промах отдельно для гостей и вошедших.
+
+    Счётчики копятся в памяти процесса и попадают в кеш раз в
+    HITS_FLUSH_INTERVAL секунд: запись в кеш на каждый просмотр
+    страницы стоила бы больше самого попадания.
+    """
+    group = 'auth' if request.user.is_authenticated else 'anon'
+    with _hits_lock:
+        _hits[STATS_KEY.format(key_prefix, group, outcome)] += 1
+        due = time.monotonic() - _hits_flushed >= HITS_FLUSH_INTERVAL
+    if due:
+        flush_hits()
+
+
+atexit.register(flush_hits)
+
+
+def hit_ratios():
+    """Доля попаданий по страницам и группам пользователей.
+
+    Другие процессы могут ещё держать до HITS_FLUSH_INTERVAL секунд
+    своих попаданий.
+    """
+    flush_hits()
+    keys = [
+        STATS_KEY.format(prefix, group, outcome)
+        for prefix in PAGE_PREFIXES
+        for group in STATS_GROUPS
+        for outcome in ('hit', 'miss')
+    ]
+    counts = cache.get_many(keys)
+    report = {}
+    for prefix in PAGE_PREFIXES:
+        for group in STATS_GROUPS:
+            hits, misses = (
+                counts.get(STATS_KEY.format(prefix, group, outcome), 0)
+                for outcome in ('hit', 'miss')
+            )
+            total = hits + misses
+            report[prefix, group] = (hits, total, hits / total if total else 0)
+    return report
+
+
+def _learn(request, response, timeout, key_prefix):
+    # Список заголовков живёт дольше страницы; когда он всё же истёк,
+    # get_cache_key вернёт None, и список запишется заново.
+    return learn_cache_key(
+        request, response, timeout + LOCK_TIMEOUT, key_prefix, cache
+    )
+
+
+def _render_page(view_func, request, args, kwargs):
+    """Рендерит страницу, собирая метки персональных фрагментов."""
+    request.donut_holes = []
+    try:
+        response = view_func(request, *args, **kwargs)
+    finally:
+        holes = request.donut_holes
+        del request.donut_holes
+    return response, holes
+
+
+def versioned_cache_page(timeout, key_prefix, scopes=None):
+    """Аналог `cache_page` с защитой от лавины пересчётов.
+
+    `scopes(request, *args, **kwargs)` возвращает области, от которых
+    зависит страница: при смене их версии страница считается
+    устаревшей. Её отдают, пока один запрос, захвативший блокировку,
+    строит новую (stale-while-revalidate).
+
+    Страница кешируется одна на всех пользователей: персональные
+    фрагменты, выведенные тегом `{% donut %}`, хранятся как метки и
+    дорисовываются для каждого запроса.
+    """
+    PAGE_PREFIXES.append(key_prefix)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            versions = ()
+            if scopes is not None:
+                versions = get_versions(
+                    scopes(request, *args, **kwargs), timeout + LOCK_TIMEOUT
+                )
+            outcome = 'hit'
+
+            def render():
+                nonlocal outcome
+                outcome = 'miss'
+                response, holes = _render_page(
+                    view_func, request, args, kwargs
+                )
+                return versions, response, holes
+
+            key = get_cache_key(request, key_prefix, 'GET', cache)
+            if key is None:
+                # Холодный старт или истёкший список заголовков. Ответы
+                # представлений не задают Vary, поэтому ключ зависит
+                # только от URL и известен до рендера: пересчёт идёт
+                # через ту же блокировку в fetch, что и обычный промах.
+                key = _learn(request, HttpResponse(), timeout, key_prefix)
+            entry = fetch(
+                key,
+                render,
+                timeout,
+                is_fresh=lambda value: value[0] == versions,
+                cacheable=lambda value: _cacheable_response(value[1]),
+            )
+            count_hit(key_prefix, request, outcome)
+            _, response, holes = entry
+            if not holes:
+                return response
+            return fill_holes(response, holes, request)
+        return wrapper
+    return decorator
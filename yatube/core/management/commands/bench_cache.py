@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.backends.sqlite import SQLiteCache
+
+PAYLOAD = 'x' * 2048
+
+
+def make_cache(name, directory, max_entries):
+    params = {'OPTIONS': {'MAX_ENTRIES': max_entries}}
+    if name == 'locmem':
+        return LocMemCache('bench', params)
+    return SQLiteCache(os.path.join(directory, 'cache.sqlite3'), params)
+
+
+def worker(name, directory, options, seed):
+    """Читает ключи с ципфовой популярностью, на промахе записывает."""
+    cache = make_cache(name, directory, options['keys'] * 2)
+    rnd = random.Random(seed)
+    weights = [
+        1 / (rank ** options['alpha'])
+        for rank in range(1, options['keys'] + 1)
+    ]
+    keys = rnd.choices(range(options['keys']), weights=weights,
+                       k=options['ops'])
+    hits, timings = 0, []
+    for key in keys:
+        started = time.perf_counter()
+        value = cache.get(f'bench:{key}')
+        timings.append(time.perf_counter() - started)
+        if value is None:
+            cache.set(f'bench:{key}', PAYLOAD, 300)
+        else:
+            hits += 1
+    return hits, timings
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает локальный кеш процесса (LocMemCache) и общий кеш '
+        'SQLiteCache при нескольких процессах: доля попаданий и задержка '
+        'чтения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--ops', type=int, default=20000)
+        parser.add_argument('--keys', type=int, default=5000)
+        parser.add_argument('--alpha', type=float, default=1.1)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"кеш":<8}{"попадания":>12}{"p50, мкс":>12}'
+            f'{"p95, мкс":>12}{"чтений/с":>12}'
+        )
+        context = multiprocessing.get_context('fork')
+        for name in ('locmem', 'sqlite'):
+            with tempfile.TemporaryDirectory() as directory:
+                started = time.perf_counter()
+                with context.Pool(options['processes']) as pool:
+                    results = pool.starmap(worker, [
+                        (name, directory, options, options['seed'] + i)
+                        for i in range(options['processes'])
+                    ])
+                elapsed = time.perf_counter() - started
+            hits = sum(result[0] for result in results)
+            timings = sorted(t for result in results for t in result[1])
+            self.stdout.write(
+                f'{name:<8}{hits / len(timings):>12.1%}'
+                f'{statistics.median(timings) * 1e6:>12.1f}'
+                f'{timings[len(timings) * 95 // 100] * 1e6:>12.1f}'
+                f'{len(timings) / elapsed:>12.0f}'
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver
+
+from core.caching import hit_ratios
+
+
+class Command(BaseCommand):
+    help = (
+        'Доля попаданий в кеш страниц отдельно для гостей и вошедших '
+        'пользователей. Имеет смысл с общим для процессов кешем.'
+    )
+
+    def handle(self, *args, **options):
+        # Импортируем представления, чтобы зарегистрировать их страницы.
+        get_resolver().url_patterns
+        for (prefix, group), (hits, total, ratio) in hit_ratios().items():
+            self.stdout.write(
+                f'{prefix:<16}{group:<6}{hits:>8}/{total:<8}{ratio:>8.1%}'
+            )
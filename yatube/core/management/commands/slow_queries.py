@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.slowqueries import read_log, report
+
+
+def most_common(counts):
+    return max(counts.items(), key=lambda item: item[1])[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка медленных запросов из SLOW_QUERY_LOG по отпечаткам SQL: '
+        'число, суммарное и наибольшее время, откуда приходят чаще всего.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Очистить лог после вывода сводки.'
+        )
+
+    def handle(self, *args, **options):
+        rows = report(read_log(settings.SLOW_QUERY_LOG))
+        if not rows:
+            self.stdout.write('Медленных запросов нет.')
+        for number, row in enumerate(rows[:options['limit']], 1):
+            self.stdout.write(
+                f'{number}. {row["count"]} раз, всего {row["total"]:.1f} мс, '
+                f'в среднем {row["total"] / row["count"]:.1f} мс, '
+                f'максимум {row["max"]:.1f} мс'
+            )
+            self.stdout.write(
+                f'   {most_common(row["views"])} — '
+                f'{most_common(row["frames"])}'
+            )
+            self.stdout.write(f'   {row["fingerprint"]}')
+        if options['clear']:
+            open(settings.SLOW_QUERY_LOG, 'w').close()
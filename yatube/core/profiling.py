@@ -0,0 +1,115 @@
+import cProfile
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+
+# Запрос профилируется, если в заголовке X-Profile или параметре
+# ?profile= передан токен, выданный сотруднику на странице профилей.
+HEADER = 'HTTP_X_PROFILE'
+PARAM = 'profile'
+SUFFIX = '.prof'
+NAME = re.compile(r'^[\w.-]+\.prof$')
+
+_signer = signing.TimestampSigner(salt='core.profiling')
+# cProfile не рассчитан на несколько профилей одновременно: пока идёт
+# один, остальные запросы с токеном выполняются без профилирования.
+_lock = threading.Lock()
+
+
+def make_token(user):
+    return _signer.sign(str(user.pk))
+
+
+def token_user(token):
+    """Сотрудник, которому выдан токен, или None для чужого,
+    просроченного или испорченного токена."""
+    try:
+        pk = _signer.unsign(token, max_age=settings.PROFILER_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return get_user_model().objects.filter(
+        pk=pk, is_staff=True, is_active=True
+    ).first()
+
+
+def dump_name(request):
+    """Имя файла профиля: время, метод и путь запроса."""
+    path = re.sub(r'[^\w-]+', '-', request.path).strip('-')[:80]
+    moment = time.strftime('%Y%m%d-%H%M%S')
+    return f'{moment}-{uuid4().hex[:6]}-{request.method}-{path}{SUFFIX}'
+
+
+def dumps():
+    """Сохранённые профили, новые первыми: (имя, размер, время)."""
+    directory = settings.PROFILER_DIR
+    try:
+        entries = [
+            entry for entry in os.scandir(directory)
+            if entry.is_file() and NAME.match(entry.name)
+        ]
+    except FileNotFoundError:
+        return []
+    files = [
+        (
+            entry.name,
+            entry.stat().st_size,
+            datetime.fromtimestamp(entry.stat().st_mtime, timezone.utc),
+        )
+        for entry in entries
+    ]
+    return sorted(files, key=lambda file: file[2], reverse=True)
+
+
+def dump_path(name):
+    """Путь к профилю по имени из URL или None, если такого нет."""
+    if not NAME.match(name):
+        return None
+    path = os.path.join(settings.PROFILER_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def rotate():
+    """Оставляет PROFILER_MAX_FILES самых новых профилей."""
+    for name, _, _ in dumps()[settings.PROFILER_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(settings.PROFILER_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+class ProfilerMiddleware:
+    """Профилирует cProfile отдельные запросы по токену сотрудника.
+
+    Профиль сохраняется в PROFILER_DIR, его имя возвращается в
+    заголовке X-Profile. Запросы без токена не замедляются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get(HEADER) or request.GET.get(PARAM)
+        if not token or token_user(token) is None:
+            return self.get_response(request)
+        if not _lock.acquire(blocking=False):
+            response = self.get_response(request)
+            response['X-Profile'] = 'busy'
+            return response
+        try:
+            profile = cProfile.Profile()
+            response = profile.runcall(self.get_response, request)
+            name = dump_name(request)
+            os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+            profile.dump_stats(os.path.join(settings.PROFILER_DIR, name))
+        finally:
+            _lock.release()
+        rotate()
+        response['X-Profile'] = name
+        return response
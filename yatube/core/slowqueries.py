@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Кадры этих модулей — обёртки вокруг запросов, а не их источник.
+WRAPPERS = {
+    os.path.join(os.path.dirname(__file__), module)
+    for module in ('budgets.py', 'slowqueries.py', 'timing.py')
+}
+PARAM_LENGTH = 200
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|\?')
+VALUES_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACES = re.compile(r'\s+')
+
+_local = threading.local()
+
+
+def fingerprint(sql):
+    """SQL без значений: запросы, отличающиеся только параметрами,
+    длиной списка в IN или числом строк в VALUES, совпадают."""
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = PLACEHOLDER.sub('?', sql)
+    sql = VALUES_LIST.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def project_frame():
+    """Ближайший к запросу кадр кода проекта: «файл:строка в функции»."""
+    root = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(root) and filename not in WRAPPERS
+                and 'site-packages' not in filename):
+            return (
+                f'{os.path.relpath(filename, root)}:{frame.f_lineno} '
+                f'in {frame.f_code.co_name}'
+            )
+        frame = frame.f_back
+    return None
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else request.path
+
+
+def record(sql, params, duration, request):
+    """Пишет медленный запрос в лог и строкой JSON в SLOW_QUERY_LOG."""
+    entry = {
+        'time': time.time(),
+        'ms': round(duration * 1000, 2),
+        'view': _view_name(request),
+        'frame': project_frame(),
+        'sql': sql,
+        'params': [repr(param)[:PARAM_LENGTH] for param in params or ()],
+        'fingerprint': fingerprint(sql),
+    }
+    logger.warning(
+        'Медленный запрос %.1f мс в %s (%s): %s', entry['ms'],
+        entry['view'], entry['frame'], sql
+    )
+    path = settings.SLOW_QUERY_LOG
+    if path:
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        # Короткая дозапись в режиме O_APPEND не перемешивается со
+        # строками других процессов.
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(line)
+
+
+def _execute(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold is not None and duration * 1000 >= threshold:
+            record(sql, None if many else params, duration, _local.request)
+
+
+def read_log(path):
+    """Записи лога медленных запросов; битые строки пропускаются."""
+    try:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def report(entries):
+    """Сводка по отпечаткам SQL, самые затратные первыми: отпечаток,
+    число, суммарное и наибольшее время в мс, представления и кадры."""
+    groups = defaultdict(lambda: {
+        'count': 0, 'total': 0.0, 'max': 0.0,
+        'views': defaultdict(int), 'frames': defaultdict(int),
+    })
+    for entry in entries:
+        group = groups[entry['fingerprint']]
+        group['count'] += 1
+        group['total'] += entry['ms']
+        group['max'] = max(group['max'], entry['ms'])
+        group['views'][entry['view']] += 1
+        group['frames'][entry['frame']] += 1
+    rows = [dict(group, fingerprint=key) for key, group in groups.items()]
+    return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+
+class SlowQueryMiddleware:
+    """Записывает запросы к базе дольше SLOW_QUERY_THRESHOLD_MS вместе с
+    представлением и строкой кода проекта, откуда они пришли.
+
+    При SLOW_QUERY_THRESHOLD_MS = None middleware выключен.
+    """
+
+    def __init__(self, get_response):
+        if getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None) is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.request = request
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_execute))
+                return self.get_response(request)
+        finally:
+            _local.request = None
@@ -0,0 +1,21 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.caching import HOLE, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def donut(context, template_name, **kwargs):
+    """Персональный фрагмент страницы.
+
+    При рендере для общего кеша вместо фрагмента выводится метка,
+    а сам он дорисовывается для каждого запроса в versioned_cache_page.
+    """
+    request = context.get('request')
+    holes = getattr(request, 'donut_holes', None)
+    if holes is None:
+        return render_hole(template_name, kwargs, request)
+    holes.append((template_name, kwargs))
+    return mark_safe(HOLE.format(len(holes) - 1))
@@ -1,4 +1,27 @@
-from django.test import Client, TestCase
+import multiprocessing
+import os
+import pstats
+from io import StringIO
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from django.urls import reverse
+
+from . import caching, profiling, slowqueries, timing
+from .backends.sqlite import SQLiteCache
+from .backends.tiered import TieredCache
+
+THREADS = 20
 
 
 class Err404Tests(TestCase):
@@ -11,3 +34,315 @@ class Err404Tests(TestCase):
         template = 'core/404.html'
         response = self.guest_client.get('notExistPage/')
         self.assertTemplateUsed(response, template)
+
+
+class StampedeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def compute(self):
+        with self.calls_lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return 'новое'
+
+    def hammer(self, key):
+        """Запускает THREADS потоков разом и собирает их результаты."""
+        barrier = threading.Barrier(THREADS)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(caching.fetch(key, self.compute, 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_expired_key_recomputed_once(self):
+        """Истёкший ключ пересчитывает один поток, прочие читают старое."""
+        caching.store('page', 'старое', timeout=-1)
+        results = self.hammer('page')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results.count('новое'), 1)
+        self.assertEqual(results.count('старое'), THREADS - 1)
+
+    def test_missing_key_recomputed_once(self):
+        """При полном промахе остальные потоки ждут первый расчёт."""
+        results = self.hammer('page')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['новое'] * THREADS)
+
+    def test_early_recompute(self):
+        """Дорогое значение пересчитывается досрочно."""
+        caching.store('page', 'старое', timeout=10, delta=5)
+        with mock.patch.object(caching.random, 'random', return_value=0.0):
+            self.assertEqual(caching.fetch('page', self.compute, 60), 'старое')
+        with mock.patch.object(caching.random, 'random', return_value=0.99):
+            self.assertEqual(caching.fetch('page', self.compute, 60), 'новое')
+        self.assertEqual(self.calls, 1)
+
+    def test_cold_page_rendered_once(self):
+        """Страницу без записи в кеше строит один запрос, даже когда
+        ключ страницы ещё не известен."""
+        view = caching.versioned_cache_page(60, 'stampede_page')(
+            lambda request: HttpResponse(self.compute())
+        )
+        barrier = threading.Barrier(THREADS)
+        results = []
+
+        def worker():
+            request = RequestFactory().get('/stampede/')
+            request.user = AnonymousUser()
+            barrier.wait()
+            results.append(view(request).content.decode())
+
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['новое'] * THREADS)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {})
+
+    def test_basic_operations(self):
+        """Запись, чтение, удаление и счётчики работают как у кеша Django."""
+        self.cache.set('key', {'a': 1})
+        self.cache.set_many({'b': 2, 'c': 3})
+        self.assertEqual(self.cache.get('key'), {'a': 1})
+        self.assertEqual(
+            self.cache.get_many(['b', 'c', 'd']), {'b': 2, 'c': 3}
+        )
+        self.assertEqual(self.cache.incr('b', 5), 7)
+        self.assertEqual(self.cache.get('b'), 7)
+        with self.assertRaises(ValueError):
+            self.cache.incr('d')
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_add_and_expiry(self):
+        """add не перезаписывает живой ключ, но занимает истёкший."""
+        self.assertTrue(self.cache.add('lock', 1))
+        self.assertFalse(self.cache.add('lock', 2))
+        self.cache.set('old', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('old'))
+        self.assertTrue(self.cache.add('old', 2))
+        self.assertEqual(self.cache.get('old'), 2)
+
+    def test_shared_between_processes(self):
+        """Запись из другого процесса видна в этом."""
+        self.cache.get('warm')
+        process = multiprocessing.get_context('fork').Process(
+            target=self.cache.set, args=('shared', 'из дочернего')
+        )
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get('shared'), 'из дочернего')
+
+    def test_cull(self):
+        """При переполнении вытесняются записи с ближайшим сроком."""
+        cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_ENTRIES': 10}})
+        cache.set('forever', 1, None)
+        for i in range(99):
+            cache.set(f'key{i}', i, 60 + i)
+        self.assertLessEqual(len(cache.get_many(
+            [f'key{i}' for i in range(99)]
+        )), 99 - 100 // 3)
+        self.assertEqual(cache.get('forever'), 1)
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = TieredCache('shared', {})
+        self.shared = caches['shared']
+
+    def test_hot_keys_served_from_process_memory(self):
+        """Повторное чтение локального ключа не идёт в общий кеш."""
+        self.cache.set('post_card:1', 'карточка')
+        self.shared.set('post_card:1', 'из другого процесса')
+        self.assertEqual(self.cache.get('post_card:1'), 'карточка')
+        self.assertEqual(self.cache.get_many(['post_card:1', 'post_card:2']),
+                         {'post_card:1': 'карточка'})
+        stats = self.cache.stats()
+        self.assertEqual(stats['local']['hits'], 2)
+        self.assertEqual(stats['shared']['misses'], 1)
+
+    def test_versions_always_read_from_shared(self):
+        """Версии не кешируются локально: их сброс виден сразу."""
+        self.cache.set('version:posts', 1)
+        self.shared.incr('version:posts')
+        self.assertEqual(self.cache.get('version:posts'), 2)
+
+    def test_local_copy_expires(self):
+        """Локальная копия живёт не дольше LOCAL_TIMEOUT."""
+        tiered = TieredCache('shared', {'OPTIONS': {'LOCAL_TIMEOUT': 0.05}})
+        tiered.set('post_card:1', 'старая')
+        self.shared.set('post_card:1', 'новая')
+        time.sleep(0.1)
+        self.assertEqual(tiered.get('post_card:1'), 'новая')
+
+    def test_stale_local_copy_reread_from_shared(self):
+        """Устаревшая локальная страница перечитывается, а не строится."""
+        key = 'views.decorators.cache.cache_page.index'
+        with mock.patch.object(caching, 'cache', self.cache):
+            caching.store(key, 'старая', 60)
+            self.shared.set(key, ('новая', 0, time.time() + 60))
+            value = caching.fetch(
+                key, mock.Mock(side_effect=AssertionError), 60,
+                is_fresh=lambda value: value == 'новая'
+            )
+        self.assertEqual(value, 'новая')
+
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_phases_reported(self):
+        """Заголовок и строка лога содержат время каждой фазы запроса."""
+        with override_settings(SERVER_TIMING=True):
+            client = Client()
+            with self.assertLogs('core.timing', 'INFO') as logs:
+                response = client.get('/')
+        header = response['Server-Timing']
+        for phase in ('db;dur=', 'tpl;dur=', 'thumb;dur=', 'cache;dur=',
+                      'total;dur='):
+            self.assertIn(phase, header)
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="SQL x[1-9]')
+        self.assertIn('path=/ status=200', logs.output[0])
+
+    def test_nested_phases_not_counted_twice(self):
+        """Время вложенной фазы вычитается из времени внешней."""
+        timings = timing.Timings()
+        timing._local.timings = timings
+        try:
+            outer = timing.timed('tpl')(
+                lambda: time.sleep(0.02) or inner() or inner()
+            )
+            inner = timing.timed('cache')(lambda: time.sleep(0.01))
+            outer()
+        finally:
+            timing._local.timings = None
+        self.assertEqual(timings.counts, {
+            'db': 0, 'tpl': 1, 'thumb': 0, 'cache': 2
+        })
+        self.assertGreaterEqual(timings.totals['cache'], 0.02)
+        self.assertLess(timings.totals['tpl'], 0.03)
+
+    def test_disabled(self):
+        """При SERVER_TIMING = False заголовка нет."""
+        self.assertNotIn('Server-Timing', Client().get('/'))
+
+
+class ProfilerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            PROFILER_DIR=directory.name, PROFILER_MAX_FILES=2
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory.name
+
+    def test_staff_token_profiles_request(self):
+        """Токен сотрудника сохраняет профиль, старые профили удаляются."""
+        token = profiling.make_token(self.staff)
+        response = self.client.get('/', HTTP_X_PROFILE=token)
+        path = os.path.join(self.directory, response['X-Profile'])
+        self.assertGreater(pstats.Stats(path).total_calls, 0)
+        self.client.get('/', {'profile': token})
+        self.client.get('/', {'profile': token})
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_other_tokens_ignored(self):
+        """Чужие и испорченные токены запрос не профилируют."""
+        for token in (profiling.make_token(self.user), 'staff:bad', '1'):
+            with self.subTest(token=token):
+                response = self.client.get('/', {'profile': token})
+                self.assertNotIn('X-Profile', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_profiles_page_for_staff_only(self):
+        """Список и скачивание профилей доступны только сотрудникам."""
+        response = self.client.get(
+            '/', HTTP_X_PROFILE=profiling.make_token(self.staff)
+        )
+        name = response['X-Profile']
+        url = reverse('core:profile_download', args=[name])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get(reverse('core:profiles')), name)
+        response = self.client.get(url)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(
+            self.client.get(
+                reverse('core:profile_download', args=['db.sqlite3'])
+            ).status_code,
+            404
+        )
+
+
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, 'slow.jsonl')
+
+    def test_fingerprint(self):
+        """Отпечаток не зависит от значений и длины списков."""
+        self.assertEqual(
+            slowqueries.fingerprint(
+                "SELECT *  FROM t WHERE a = 'x''y' AND b IN (%s, %s, %s)\n"
+                'LIMIT 21'
+            ),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?'
+        )
+
+    def test_slow_queries_logged_and_reported(self):
+        """Медленные запросы пишутся с представлением и кадром проекта
+        и сводятся командой slow_queries."""
+        with override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=self.log
+        ):
+            with self.assertLogs('core.slowqueries', 'WARNING'):
+                Client().get('/')
+                Client().get('/group/missing/')
+            entries = list(slowqueries.read_log(self.log))
+            self.assertEqual(
+                {entry['view'] for entry in entries},
+                {'posts:index', 'posts:group_list'}
+            )
+            frames = [entry['frame'] for entry in entries]
+            self.assertIn('posts/views.py', ' '.join(frames))
+            self.assertFalse(any(
+                frame.startswith(('core/timing', 'core/budgets'))
+                for frame in frames
+            ))
+            out = StringIO()
+            call_command('slow_queries', '--clear', stdout=out)
+        self.assertIn('posts:group_list — posts/views.py:', out.getvalue())
+        self.assertEqual(os.path.getsize(self.log), 0)
@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+# Фазы запроса в порядке вывода: имя метрики Server-Timing и описание.
+PHASES = (
+    ('db', 'SQL'),
+    ('tpl', 'Templates'),
+    ('thumb', 'Thumbnails'),
+    ('cache', 'Cache'),
+)
+CACHE_METHODS = (
+    'add', 'get', 'set', 'delete', 'get_many', 'set_many', 'delete_many',
+    'get_or_set', 'has_key', 'incr', 'decr', 'touch',
+)
+
+_local = threading.local()
+
+
+class Timings:
+    """Время фаз одного запроса.
+
+    Время фазы собственное: вложенные в неё фазы (SQL из шаблона, кеш
+    из поиска миниатюр) вычитаются. Повторный вход в уже идущую фазу
+    (include в шаблоне, TieredCache над общим кешем) не считается.
+    """
+
+    def __init__(self):
+        self.totals = dict.fromkeys((name for name, _ in PHASES), 0.0)
+        self.counts = dict.fromkeys(self.totals, 0)
+        self.stack = []
+
+    def call(self, name, func, *args, **kwargs):
+        if any(frame[0] == name for frame in self.stack):
+            return func(*args, **kwargs)
+        frame = [name, 0.0]
+        self.stack.append(frame)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stack.pop()
+            self.totals[name] += elapsed - frame[1]
+            self.counts[name] += 1
+            if self.stack:
+                self.stack[-1][1] += elapsed
+
+
+def timed(name):
+    """Декоратор: время функции попадает в фазу name текущего запроса.
+
+    Вне запроса с включённым SERVER_TIMING функция вызывается как есть.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = getattr(_local, 'timings', None)
+            if timings is None:
+                return func(*args, **kwargs)
+            return timings.call(name, func, *args, **kwargs)
+        wrapper.timing = name
+        return wrapper
+    return decorator
+
+
+def _instrument(owner, attr, name):
+    original = getattr(owner, attr, None)
+    if original is None or getattr(original, 'timing', None):
+        return
+    setattr(owner, attr, timed(name)(original))
+
+
+def install():
+    """Оборачивает рендер шаблонов и методы бэкендов кеша. Вызывается
+    один раз, при включённом SERVER_TIMING."""
+    _instrument(Template, 'render', 'tpl')
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        for method in CACHE_METHODS:
+            _instrument(backend, method, 'cache')
+
+
+def _execute(execute, sql, params, many, context):
+    return _local.timings.call('db', execute, sql, params, many, context)
+
+
+class ServerTimingMiddleware:
+    """Заголовок Server-Timing и строка лога со временем SQL, шаблонов,
+    миниатюр и кеша.
+
+    При SERVER_TIMING = False Django исключает middleware из цепочки,
+    и запросы не обходятся ничем.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVER_TIMING', False):
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = _local.timings = Timings()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_execute))
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+        total = time.perf_counter() - start
+        metrics = [
+            f'{name};dur={timings.totals[name] * 1000:.1f};'
+            f'desc="{description} x{timings.counts[name]}"'
+            for name, description in PHASES
+        ]
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(metrics)
+        logger.info(
+            'method=%s path=%s status=%s total=%.1f %s',
+            request.method, request.path, response.status_code,
+            total * 1000,
+            ' '.join(
+                f'{name}={timings.totals[name] * 1000:.1f}/'
+                f'{timings.counts[name]}'
+                for name, _ in PHASES
+            ),
+            extra={'timings': {
+                name: (timings.totals[name], timings.counts[name])
+                for name, _ in PHASES
+            }},
+        )
+        return response
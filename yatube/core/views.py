@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404
 from django.shortcuts import render
 
+from . import profiling
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +16,23 @@ def error_500(request):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403_csrf.html')
+
+
+@staff_member_required
+def profiles(request):
+    """Профили запросов, снятые ProfilerMiddleware, и токен, которым
+    сотрудник включает профилирование."""
+    context = {
+        'dumps': profiling.dumps(),
+        'token': profiling.make_token(request.user),
+        'max_age': settings.PROFILER_TOKEN_MAX_AGE // 60,
+    }
+    return render(request, 'core/profiles.html', context)
+
+
+@staff_member_required
+def profile_download(request, name):
+    path = profiling.dump_path(name)
+    if path is None:
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
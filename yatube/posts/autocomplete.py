@@ -0,0 +1,155 @@
+import threading
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+
+from core.caching import VERSION_KEY, get_versions
+from .models import Group, User
+
+# Область версии в кеше: её сдвигает любой процесс, изменивший
+# пользователей или группы, и остальные перестраивают свой индекс.
+SCOPE = 'autocomplete'
+LIMIT = 10
+
+
+def user_item(user):
+    full_name = user.get_full_name()
+    terms = {user.username, full_name, *full_name.split()}
+    return {
+        'type': 'user',
+        'label': full_name or user.username,
+        'username': user.username,
+    }, terms
+
+
+def group_item(group):
+    terms = {group.title, group.slug, *group.title.split()}
+    return {
+        'type': 'group',
+        'label': group.title,
+        'slug': group.slug,
+    }, terms
+
+
+class PrefixIndex:
+    """Отсортированный массив строк для поиска по префиксу.
+
+    entries — пары (строка в нижнем регистре, ключ объекта) по
+    возрастанию, items — сами ответы по ключам. Поиск и изменение —
+    двоичный поиск по entries и вставка или удаление в массиве.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.items = {}
+        self.item_terms = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    def load(self, version):
+        entries = []
+        items, item_terms = {}, {}
+        for user in User.objects.only(
+            'username', 'first_name', 'last_name'
+        ).iterator():
+            self._collect(('user', user.pk), *user_item(user),
+                          entries, items, item_terms)
+        for group in Group.objects.only('title', 'slug').iterator():
+            self._collect(('group', group.pk), *group_item(group),
+                          entries, items, item_terms)
+        entries.sort()
+        with self.lock:
+            self.entries = entries
+            self.items, self.item_terms = items, item_terms
+            self.version = version
+
+    @staticmethod
+    def _collect(ref, item, terms, entries, items, item_terms):
+        terms = {term.casefold() for term in terms if term}
+        items[ref] = item
+        item_terms[ref] = terms
+        entries.extend((term, ref) for term in terms)
+
+    def put(self, ref, item, terms):
+        terms = {term.casefold() for term in terms if term}
+        with self.lock:
+            self._remove(ref)
+            self.items[ref] = item
+            self.item_terms[ref] = terms
+            for term in terms:
+                insort(self.entries, (term, ref))
+
+    def remove(self, ref):
+        with self.lock:
+            self._remove(ref)
+
+    def _remove(self, ref):
+        self.items.pop(ref, None)
+        for term in self.item_terms.pop(ref, ()):
+            position = bisect_left(self.entries, (term, ref))
+            if self.entries[position:position + 1] == [(term, ref)]:
+                del self.entries[position]
+
+    def search(self, prefix, limit=LIMIT):
+        prefix = prefix.casefold()
+        found = {}
+        with self.lock:
+            position = bisect_left(self.entries, (prefix,))
+            while position < len(self.entries) and len(found) < limit:
+                term, ref = self.entries[position]
+                if not term.startswith(prefix):
+                    break
+                found.setdefault(ref, self.items[ref])
+                position += 1
+        return list(found.values())
+
+
+_index = PrefixIndex()
+
+
+def _current_version():
+    return get_versions([SCOPE])[0]
+
+
+def search(prefix, limit=LIMIT):
+    """Пользователи и группы, у которых имя, логин, название или slug
+    начинаются с prefix. Индекс строится при первом запросе и
+    перестраивается, если его изменил другой процесс."""
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    version = _current_version()
+    if _index.version != version:
+        _index.load(version)
+    return _index.search(prefix, limit)
+
+
+def _changed():
+    """Сообщает другим процессам об изменении. Свой индекс остаётся
+    актуальным, только если между изменениями никто больше не менял."""
+    key = VERSION_KEY.format(SCOPE)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        return
+    with _index.lock:
+        if _index.version is not None and version == _index.version + 1:
+            _index.version = version
+
+
+def update_user(user):
+    if _index.version is not None:
+        _index.put(('user', user.pk), *user_item(user))
+    _changed()
+
+
+def update_group(group):
+    if _index.version is not None:
+        _index.put(('group', group.pk), *group_item(group))
+    _changed()
+
+
+def remove(kind, pk):
+    if _index.version is not None:
+        _index.remove((kind, pk))
+    _changed()
@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models import Case, F, When
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .models import ImageBlob, Post
+from .storage import is_blob
+
+
+def _storage():
+    return Post._meta.get_field('image').storage
+
+
+def acquire(name, count=1, content=None):
+    """Учитывает ещё count постов с файлом name.
+
+    Хранилище не пишет файл, который уже есть, поэтому загрузка могла
+    застать файл, который тут же удалил _delete_file. Удаление и acquire
+    упорядочены блокировкой строки ImageBlob, так что после acquire
+    файл уже никто не удалит: если его нет, он записывается заново
+    из content.
+    """
+    if not is_blob(name):
+        return
+    blobs = ImageBlob.objects.filter(name=name)
+    with transaction.atomic():
+        if not blobs.update(refs=F('refs') + count):
+            ImageBlob.objects.get_or_create(name=name)
+            blobs.update(refs=F('refs') + count)
+    if content is not None and not _storage().exists(name):
+        _storage().save(name, content)
+
+
+def release(name, count=1):
+    """count постов больше не ссылаются на name: последний освобождает
+    файл."""
+    if not is_blob(name):
+        return
+    blobs = ImageBlob.objects.filter(name=name)
+    with transaction.atomic():
+        blobs.update(refs=Case(
+            When(refs__gt=count, then=F('refs') - count), default=0
+        ))
+        deleted, _ = blobs.filter(refs=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: _delete_file(name))
+
+
+def _delete_file(name):
+    with transaction.atomic():
+        # Строка создаётся и блокируется на время удаления: acquire того
+        # же файла ждёт, пока файл не удалён, а потом видит, что его нет.
+        blob, _ = (
+            ImageBlob.objects.select_for_update().get_or_create(name=name)
+        )
+        # Пока файл ждал удаления, его могли загрузить заново.
+        if blob.refs:
+            return
+        # Вместе с файлом удаляются его миниатюры и записи sorl о них.
+        delete_with_thumbnails(ImageFile(name, _storage()))
+        blob.delete()
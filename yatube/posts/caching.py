@@ -0,0 +1,53 @@
+from core.caching import bump_versions
+
+# Области версионного кеша страниц posts.views: смена версии области
+# делает устаревшими все закешированные страницы, которые от неё зависят.
+ALL = 'posts'
+INDEX = 'posts:index'
+
+
+def group_scope(slug):
+    return f'posts:group:{slug}'
+
+
+def profile_scope(username):
+    return f'posts:profile:{username}'
+
+
+def index_scopes(request):
+    return (ALL, INDEX)
+
+
+def group_scopes(request, slug):
+    return (ALL, group_scope(slug))
+
+
+def profile_scopes(request, username):
+    return (ALL, profile_scope(username))
+
+
+def post_scopes(post):
+    """Страницы, на которых выводится пост."""
+    group_slug = post.group.slug if post.group is not None else None
+    return page_scopes(post.author.username, group_slug)
+
+
+def page_scopes(username, group_slug=None):
+    """Страницы поста автора username из группы group_slug."""
+    scopes = [INDEX, profile_scope(username)]
+    if group_slug is not None:
+        scopes.append(group_scope(group_slug))
+    return scopes
+
+
+def invalidate_post(post, previous_scopes=()):
+    """Сбрасывает страницы поста и те, где он выводился до правки."""
+    bump_versions(*post_scopes(post), *previous_scopes)
+
+
+def invalidate_all():
+    bump_versions(ALL)
+
+
+def invalidate_profile(username):
+    bump_versions(profile_scope(username))
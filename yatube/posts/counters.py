@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, ImageBlob, Post, User, UserStats
+from .storage import is_blob
+
+
+def _shift(queryset, **deltas):
+    """Сдвигает счётчики на месте; не уводит их ниже нуля."""
+    guards = {
+        f'{field}__gte': -delta
+        for field, delta in deltas.items() if delta < 0
+    }
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    return queryset.filter(**guards).update(**changes)
+
+
+def bump_user(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя на заданные величины."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    with transaction.atomic():
+        if not _shift(stats, **deltas) and min(deltas.values()) > 0:
+            UserStats.objects.get_or_create(user_id=user_id)
+            _shift(stats, **deltas)
+
+
+def bump_post(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), comments_count=delta)
+
+
+def _count(queryset, field):
+    """Подзапрос с числом строк queryset на каждое значение field."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by().values(field)
+            .annotate(total=Count('pk')).values('total')
+        ),
+        0
+    )
+
+
+def _repair(queryset, counters):
+    """Исправляет расходящиеся счётчики, возвращает число таких строк."""
+    fixed = 0
+    for field, actual in counters.items():
+        drifted = (
+            queryset.annotate(actual=actual)
+            .exclude(**{field: F('actual')})
+        )
+        fixed += drifted.count()
+        queryset.filter(pk__in=drifted.values('pk')).update(**{field: actual})
+    return fixed
+
+
+def recount():
+    """Пересчитывает все счётчики по исходным таблицам."""
+    with transaction.atomic():
+        missing = User.objects.filter(stats__isnull=True)
+        UserStats.objects.bulk_create(
+            UserStats(user_id=user_id)
+            for user_id in missing.values_list('pk', flat=True)
+        )
+        fixed = _repair(UserStats.objects.all(), {
+            'posts_count': _count(Post.objects.all(), 'author'),
+            'followers_count': _count(Follow.objects.all(), 'author'),
+            'following_count': _count(Follow.objects.all(), 'user'),
+        })
+        fixed += _repair(Post.objects.all(), {
+            'comments_count': _count(Comment.objects.all(), 'post'),
+        })
+        images = Post.objects.values_list('image', flat=True).distinct()
+        known = set(ImageBlob.objects.values_list('name', flat=True))
+        ImageBlob.objects.bulk_create(
+            ImageBlob(name=name) for name in images
+            if is_blob(name) and name not in known
+        )
+        fixed += _repair(ImageBlob.objects.all(), {
+            'refs': _count(Post.objects.all(), 'image'),
+        })
+    return fixed
@@ -1,6 +1,10 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
 
+from .images import strip_exif
 from .models import Comment, Post
+from .uploads import RejectedUpload, bytes_error, limits_error
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +12,40 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image',)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Картинку, отклонённую ImageUploadHandler, поле не увидит:
+        # причину покажет clean_image.
+        self.upload_error = None
+        if isinstance(self.files.get('image'), RejectedUpload):
+            self.files = self.files.copy()
+            self.upload_error = self.files.pop('image')[0].error
+
+    def clean_image(self):
+        """Проверяет ограничения POSTS_IMAGE_MAX_BYTES и
+        POSTS_IMAGE_MAX_PIXELS и убирает из картинки EXIF: в нём бывают
+        координаты съёмки и данные камеры.
+
+        Загрузки через ImageUploadHandler проверены ещё при чтении
+        запроса, остальные — здесь, по заголовку, до того как картинка
+        будет декодирована.
+        """
+        if self.upload_error is not None:
+            raise forms.ValidationError(self.upload_error, code='too_large')
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            if image.size > settings.POSTS_IMAGE_MAX_BYTES:
+                raise forms.ValidationError(bytes_error(), code='too_large')
+            error = limits_error(*image.image.size)
+            if error is not None:
+                raise forms.ValidationError(error, code='too_large')
+            content = strip_exif(image)
+            if content is not None:
+                image = SimpleUploadedFile(
+                    image.name, content, image.content_type
+                )
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,67 @@
+import base64
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+ORIENTATION = 0x0112
+# Значения ORIENTATION, при которых стороны картинки меняются местами.
+ROTATED = {5, 6, 7, 8}
+
+
+def strip_exif(file):
+    """Содержимое картинки без EXIF или None, если EXIF в ней нет.
+
+    Поворот из EXIF применяется к пикселям, чтобы картинка выглядела
+    так же. JPEG без поворота пересохраняется с прежними таблицами
+    квантования, без потери качества. Анимации не трогаются.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        exif = image.getexif()
+        if not exif or getattr(image, 'n_frames', 1) > 1:
+            return None
+        format_ = image.format
+        params = {}
+        if 'icc_profile' in image.info:
+            params['icc_profile'] = image.info['icc_profile']
+        if exif.get(ORIENTATION, 1) != 1:
+            image = ImageOps.exif_transpose(image)
+            if format_ == 'JPEG':
+                params['quality'] = 95
+        elif format_ == 'JPEG':
+            params['quality'] = 'keep'
+        content = BytesIO()
+        image.save(content, format_, **params)
+    file.seek(0)
+    return content.getvalue()
+
+
+def preview(file, width, aspect=None):
+    """Размеры картинки и её крошечная копия шириной width для заглушки.
+
+    Возвращает ((ширина, высота), data: URI). Размеры — с учётом
+    поворота из EXIF. С aspect копия обрезается по центру до этих
+    пропорций (ширина / высота), как миниатюра.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        size = image.size
+        if image.getexif().get(ORIENTATION, 1) in ROTATED:
+            size = size[::-1]
+        aspect = aspect or size[0] / size[1]
+        box = (width, max(1, round(width / aspect)))
+        # JPEG декодируется сразу уменьшенным.
+        image.draft('RGB', (box[0] * 2, box[1] * 2))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image = ImageOps.fit(image, box, Image.BILINEAR)
+    file.seek(0)
+    Image.init()
+    if 'WEBP' in Image.SAVE:
+        format_, params = 'WEBP', {'quality': 40}
+    else:
+        # PNG без потерь: quality ему не нужен, только optimize.
+        format_, params = 'PNG', {'optimize': True}
+    content = BytesIO()
+    image.save(content, format_, **params)
+    data = base64.b64encode(content.getvalue()).decode()
+    return size, f'data:image/{format_.lower()};base64,{data}'
@@ -0,0 +1,148 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts import timelines
+from posts.models import Follow, Post, TimelineEntry, User
+from posts.paginators import CursorPaginator
+
+PER_PAGE = 10
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает стоимость записи и задержку чтения ленты подписок '
+        'при рассылке, чтении на лету и гибридной схеме на синтетическом '
+        'графе подписок со степенным распределением. Все данные '
+        'создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--writes', type=int, default=200)
+        parser.add_argument('--reads', type=int, default=200)
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степени в распределении популярности авторов.'
+        )
+        parser.add_argument(
+            '--threshold', type=int, default=100,
+            help='Порог подписчиков для гибридной схемы.'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        users = self.make_users(options['users'])
+        weights = [
+            1 / (rank ** options['alpha'])
+            for rank in range(1, len(users) + 1)
+        ]
+        self.make_follows(users, weights)
+        self.make_posts(users, weights, options['posts'])
+        followers = sorted(
+            timelines.followers_count(user.pk) for user in users[:5]
+        )
+        self.stdout.write(
+            f'Пользователей: {len(users)}, подписок: '
+            f'{Follow.objects.count()}, постов: {Post.objects.count()}, '
+            f'подписчиков у топ-5 авторов: {followers[::-1]}'
+        )
+        scenarios = (
+            ('push', len(users) + 1),
+            ('hybrid', options['threshold']),
+            ('pull', 0),
+        )
+        self.stdout.write(
+            f'{"схема":<8}{"запись, мс":>12}{"строк/пост":>12}'
+            f'{"чтение p50, мс":>16}{"чтение p95, мс":>16}'
+        )
+        for name, threshold in scenarios:
+            with override_settings(POSTS_CELEBRITY_FOLLOWERS=threshold):
+                timelines.rebuild()
+                write_ms, rows = self.measure_writes(
+                    users, weights, options['writes']
+                )
+                reads = self.measure_reads(users, options['reads'])
+            self.stdout.write(
+                f'{name:<8}{write_ms:>12.3f}{rows:>12.1f}'
+                f'{statistics.median(reads):>16.3f}'
+                f'{self.percentile(reads, 95):>16.3f}'
+            )
+
+    def make_users(self, count):
+        User.objects.bulk_create(
+            User(username=f'bench_{i}', password='!') for i in range(count)
+        )
+        return list(
+            User.objects.filter(username__startswith='bench_').order_by('pk')
+        )
+
+    def make_follows(self, users, weights):
+        follows = []
+        for user in users:
+            count = min(
+                int(self.random.paretovariate(1.5)) * 5, len(users) - 1
+            )
+            authors = set(
+                self.random.choices(users, weights=weights, k=count)
+            )
+            authors.discard(user)
+            follows.extend(
+                Follow(user=user, author=author) for author in authors
+            )
+        Follow.objects.bulk_create(follows, batch_size=timelines.BATCH_SIZE)
+
+    def make_posts(self, users, weights, count):
+        Post.objects.bulk_create(
+            (
+                Post(author=author, text='Синтетический пост')
+                for author in self.random.choices(
+                    users, weights=weights, k=count
+                )
+            ),
+            batch_size=timelines.BATCH_SIZE,
+        )
+
+    def measure_writes(self, users, weights, count):
+        authors = self.random.choices(users, weights=weights, k=count)
+        entries = TimelineEntry.objects.count()
+        started = time.perf_counter()
+        for author in authors:
+            Post.objects.create(author=author, text='Новый пост')
+        elapsed = time.perf_counter() - started
+        written = TimelineEntry.objects.count() - entries
+        return elapsed * 1000 / count, written / count
+
+    def measure_reads(self, users, count):
+        readers = self.random.sample(users, min(count, len(users)))
+        timings = []
+        for reader in readers:
+            started = time.perf_counter()
+            feed = timelines.follow_feed(reader)
+            page = CursorPaginator(feed, PER_PAGE, tiebreak='post_id')
+            timelines.timeline_posts(page.get_page())
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    @staticmethod
+    def percentile(values, percent):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, len(ordered) * percent // 100)]
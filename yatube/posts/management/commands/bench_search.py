@@ -0,0 +1,131 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.search import (
+    COUNT_SQL, CREATE_SQL, NEWEST_SQL, RANK_LIMIT, RANKED_SQL, TABLE,
+    match_query,
+)
+
+SYLLABLES = [
+    consonant + vowel
+    for consonant in 'бвгдзклмнпрстфх'
+    for vowel in 'аеиоуыя'
+]
+# Так Django строит text__icontains в SQLite, с сортировкой ленты.
+LIKE_COUNT_SQL = (
+    "SELECT count(*) FROM posts_post WHERE text LIKE ? ESCAPE '\\'"
+)
+LIKE_PAGE_SQL = (
+    "SELECT id FROM posts_post WHERE text LIKE ? ESCAPE '\\' "
+    'ORDER BY pub_date DESC LIMIT 10'
+)
+
+
+def vocabulary(size, rnd):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4))))
+    return sorted(words)
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск постов через icontains (LIKE) и через индекс '
+        'FTS5 на отдельной базе SQLite с синтетическими постами: первая '
+        'страница результатов вместе с подсчётом совпадений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--words', type=int, default=50_000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        words = vocabulary(options['words'], rnd)
+        # Частоты слов — по закону Ципфа, как в живом тексте.
+        weights = [1 / rank for rank in range(1, len(words) + 1)]
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+            started = time.perf_counter()
+            self.fill(db, words, weights, rnd, options['posts'])
+            self.stdout.write(
+                f'Постов: {options["posts"]}, заполнение: '
+                f'{time.perf_counter() - started:.0f} с'
+            )
+            queries = {
+                'частое слово': words[0],
+                'редкое слово': words[len(words) // 2],
+                'два слова': f'{words[1]} {words[20]}',
+            }
+            self.stdout.write(
+                f'{"запрос":<14}{"найдено":>10}'
+                f'{"icontains, мс":>16}{"FTS5, мс":>12}'
+            )
+            for title, query in queries.items():
+                self.compare(db, title, query, options['repeat'])
+            db.close()
+
+    def fill(self, db, words, weights, rnd, count):
+        db.execute(
+            'CREATE TABLE posts_post (id INTEGER PRIMARY KEY, '
+            'text TEXT NOT NULL, pub_date REAL NOT NULL)'
+        )
+        db.execute(CREATE_SQL)
+        cum_weights = []
+        total = 0
+        for weight in weights:
+            total += weight
+            cum_weights.append(total)
+        batch = 10_000
+        for start in range(0, count, batch):
+            rows = [
+                (pk, ' '.join(rnd.choices(
+                    words, cum_weights=cum_weights, k=rnd.randint(10, 40)
+                )), pk)
+                for pk in range(start + 1, min(start + batch, count) + 1)
+            ]
+            db.executemany('INSERT INTO posts_post VALUES (?, ?, ?)', rows)
+            db.executemany(
+                f'INSERT INTO {TABLE} (rowid, text) VALUES (?, ?)',
+                [(pk, text) for pk, text, _ in rows]
+            )
+        db.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+        db.commit()
+
+    def compare(self, db, title, query, repeat):
+        # В icontains вся строка запроса ищется как подстрока.
+        like = f'%{query}%'
+        match = match_query(query)
+        counted = COUNT_SQL.replace('%s', '?')
+        found = db.execute(counted, [match]).fetchone()[0]
+        # Тот же выбор порядка, что в SearchResults.
+        ranked = (RANKED_SQL if found <= RANK_LIMIT else NEWEST_SQL)
+        ranked = ranked.replace('%s', '?')
+        like_ms = timed(lambda: (
+            db.execute(LIKE_COUNT_SQL, [like]).fetchone(),
+            db.execute(LIKE_PAGE_SQL, [like]).fetchall(),
+        ), repeat)
+        fts_ms = timed(lambda: (
+            db.execute(counted, [match]).fetchone(),
+            db.execute(ranked, [match, 10, 0]).fetchall(),
+        ), repeat)
+        self.stdout.write(
+            f'{title:<14}{found:>10}{like_ms:>16.1f}{fts_ms:>12.1f}'
+        )
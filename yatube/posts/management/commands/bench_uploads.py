@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management.base import BaseCommand
+from django.test.client import BOUNDARY, MULTIPART_CONTENT
+from django.test.utils import override_settings
+from PIL import Image
+
+from posts.forms import PostForm
+from posts.uploads import ImageUploadHandler
+
+MODES = ('default', 'streaming')
+MAKE = 0x010F
+
+
+def make_images(directory):
+    """Картинки для замера: [(описание, путь)].
+
+    У всех есть EXIF, как у снимков с камеры: форма его вырезает и для
+    этого декодирует картинку целиком.
+    """
+    exif = Image.Exif()
+    exif[MAKE] = 'bench'
+    images = []
+    for title, name, image, params in (
+        ('фото 3 Мп', 'photo.jpg', noise((2000, 1500)), {'quality': 90}),
+        ('фото 35 Мп', 'large.jpg', noise((7000, 5000)), {'quality': 95}),
+        ('PNG 144 Мп', 'bomb.png', Image.new('1', (12000, 12000)), {}),
+    ):
+        path = os.path.join(directory, name)
+        image.save(path, exif=exif, **params)
+        images.append((title, path))
+    return images
+
+
+def noise(size):
+    return Image.merge('RGB', [Image.effect_noise(size, 40)] * 3)
+
+
+def write_body(image, path):
+    """Тело multipart-запроса формы поста: поля и файл картинки."""
+    with open(path, 'wb') as body, open(image, 'rb') as source:
+        body.write(
+            f'--{BOUNDARY}\r\n'
+            'Content-Disposition: form-data; name="text"\r\n\r\n'
+            'Пост с картинкой\r\n'
+            f'--{BOUNDARY}\r\n'
+            'Content-Disposition: form-data; name="image"; '
+            f'filename="{os.path.basename(image)}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'.encode()
+        )
+        while True:
+            chunk = source.read(2 ** 20)
+            if not chunk:
+                break
+            body.write(chunk)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+
+
+def peak_rss():
+    """Пиковый RSS процесса в байтах.
+
+    В Linux берётся VmHWM: ru_maxrss там наследуется от родителя через
+    fork и exec и показал бы пик процесса, создававшего картинки.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # В macOS ru_maxrss — в байтах.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def handle_upload(mode, path):
+    """Разбирает запрос из файла path и проверяет форму поста."""
+    with open(path, 'rb') as body:
+        request = WSGIRequest({
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/create/',
+            'CONTENT_TYPE': MULTIPART_CONTENT,
+            'CONTENT_LENGTH': str(os.path.getsize(path)),
+            'wsgi.input': body,
+        })
+        if mode == 'streaming':
+            request.upload_handlers.insert(0, ImageUploadHandler(request))
+            limits = {}
+        else:
+            # Прежнее поведение: стандартные обработчики и никаких
+            # ограничений, кроме проверок самого Pillow.
+            limits = {
+                'POSTS_IMAGE_MAX_BYTES': float('inf'),
+                'POSTS_IMAGE_MAX_PIXELS': float('inf'),
+            }
+        with override_settings(**limits):
+            form = PostForm(request.POST, files=request.FILES)
+            valid = form.is_valid()
+    return 'принят' if valid else 'отклонён'
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает большие картинки через форму поста и сравнивает пиковую '
+        'память процесса (RSS) со стандартными обработчиками загрузки '
+        'Django и с ImageUploadHandler. Каждая загрузка выполняется в '
+        'отдельном процессе.'
+    )
+
+    def add_arguments(self, parser):
+        # Служебный режим: одна загрузка в дочернем процессе.
+        parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.child(*options['child'])
+            return
+        self.stdout.write(
+            f'Лимиты: {settings.POSTS_IMAGE_MAX_BYTES / 2 ** 20:g} МБ, '
+            f'{settings.POSTS_IMAGE_MAX_PIXELS / 10 ** 6:g} Мп'
+        )
+        self.stdout.write(
+            f'{"картинка":<12} {"файл, МБ":>9} {"обработчик":<10} '
+            f'{"результат":<9} {"пик RSS, МБ":>12} {"прирост, МБ":>12} '
+            f'{"время, мс":>10}'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for title, image in make_images(directory):
+                body = os.path.join(directory, 'body')
+                write_body(image, body)
+                size = os.path.getsize(image) / 2 ** 20
+                for mode in MODES:
+                    result = self.run_child(mode, body)
+                    self.stdout.write(
+                        f'{title:<12} {size:>9.1f} {mode:<10} '
+                        f'{result["result"]:<9} '
+                        f'{result["peak"] / 2 ** 20:>12.1f} '
+                        f'{result["growth"] / 2 ** 20:>12.1f} '
+                        f'{result["ms"]:>10.1f}'
+                    )
+
+    def run_child(self, mode, body):
+        output = subprocess.run(
+            [sys.executable, sys.argv[0], 'bench_uploads',
+             '--child', mode, body],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        return json.loads(output)
+
+    def child(self, mode, body):
+        before = peak_rss()
+        started = time.perf_counter()
+        result = handle_upload(mode, body)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(json.dumps({
+            'result': result,
+            'peak': peak_rss(),
+            # Насколько загрузка подняла пик памяти процесса.
+            'growth': peak_rss() - before,
+            'ms': elapsed * 1000,
+        }))
@@ -0,0 +1,51 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from posts import blobs, caching
+from posts.models import Post
+from posts.storage import is_blob
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище по хешу содержимого: '
+        'одинаковые файлы сливаются в один. Уже перенесённые файлы '
+        'пропускаются, поэтому команду можно прервать и запустить снова.'
+    )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = [
+            name for name in
+            Post.objects.order_by().values_list('image', flat=True).distinct()
+            if name and not is_blob(name)
+        ]
+        moved = skipped = freed = 0
+        for name in names:
+            try:
+                with storage.open(name) as file:
+                    blob = storage.blob_name(name, file)
+                    if storage.exists(blob):
+                        freed += file.size
+                    else:
+                        storage.save(name, file)
+            except (OSError, SuspiciousFileOperation):
+                skipped += 1
+                continue
+            with transaction.atomic():
+                count = Post.objects.filter(image=name).update(
+                    image=blob, updated=timezone.now()
+                )
+                blobs.acquire(blob, count)
+            delete_with_thumbnails(ImageFile(name, storage))
+            moved += 1
+        if moved:
+            caching.invalidate_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {moved}, пропущено: {skipped}, '
+            f'освобождено байт: {freed}.'
+        ))
@@ -0,0 +1,234 @@
+import json
+import os
+import re
+import time
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts.models import ImageBlob, Post
+
+# Копии миниатюр для экранов высокой плотности: name@2x.jpg.
+RESOLUTION_SUFFIX = re.compile(r'@[\d.]+x(?=\.\w+$)')
+KEYS_PER_QUERY = 100
+
+
+def walk(root, parts, after):
+    """Файлы каталога в порядке имён, начиная после пути after.
+
+    Пути — кортежи частей относительно root: так их порядок совпадает
+    с порядком обхода. Поддеревья, целиком лежащие до after, не читаются.
+    """
+    try:
+        entries = sorted(os.scandir(os.path.join(root, *parts)),
+                         key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        path = (*parts, entry.name)
+        if entry.is_dir(follow_symlinks=False):
+            if path >= after[:len(path)]:
+                yield from walk(root, path, after)
+        elif path > after:
+            yield '/'.join(path), entry
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов и миниатюры, на которые не ссылается ни '
+        'один пост. Файлы обходятся по порядку пачками; место, где обход '
+        'остановился, запоминается, и следующий запуск продолжает с него.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.'
+        )
+        parser.add_argument('--batch', type=int, default=500)
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help='Остановиться после стольких пачек.'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.1,
+            help='Пауза между пачками в секундах, чтобы не нагружать диск.'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: их пост '
+                 'может быть ещё не сохранён.'
+        )
+        parser.add_argument(
+            '--state', default=os.path.join(settings.BASE_DIR, '.gc_media'),
+            help='Файл, где запоминается место остановки.'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать обход заново.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.storage = Post._meta.get_field('image').storage
+        self.images_root = Post._meta.get_field('image').upload_to.strip('/')
+        self.cache_root = sorl_settings.THUMBNAIL_PREFIX.strip('/')
+        state = {} if options['restart'] else self.load_state()
+        after = tuple(state.get('after', '').split('/'))
+        roots = (self.images_root + '/', self.cache_root + '/')
+        files = (
+            item for item in walk(settings.MEDIA_ROOT, (), after)
+            if item[0].startswith(roots)
+        )
+        checked = deleted = reclaimed = batches = 0
+        limit = options['max_batches']
+        while limit is None or batches < limit:
+            batch = list(islice(files, options['batch']))
+            if not batch:
+                state = {}
+                break
+            orphans = self.orphans(batch)
+            checked += len(batch)
+            deleted += len(orphans)
+            reclaimed += sum(size for _, size in orphans)
+            if not options['dry_run']:
+                self.delete(orphans)
+            state['after'] = batch[-1][0]
+            batches += 1
+            time.sleep(options['pause'])
+        if not options['dry_run']:
+            self.save_state(state)
+        suffix = ' (пробный запуск)' if options['dry_run'] else ''
+        done = 'обход завершён' if not state else 'обход не завершён'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено файлов: {checked}, удалено: {deleted}, освобождено '
+            f'байт: {reclaimed}; {done}{suffix}.'
+        ))
+
+    def load_state(self):
+        try:
+            with open(self.options['state']) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        if not state:
+            if os.path.exists(self.options['state']):
+                os.remove(self.options['state'])
+            return
+        with open(self.options['state'], 'w') as file:
+            json.dump(state, file)
+
+    def referenced(self, names):
+        """Имена из names, на которые ссылается пост или общий файл."""
+        referenced = set(
+            Post.objects.filter(image__in=names)
+            .values_list('image', flat=True)
+        )
+        referenced.update(
+            ImageBlob.objects.filter(name__in=names, refs__gt=0)
+            .values_list('name', flat=True)
+        )
+        return referenced
+
+    def thumbnail_lists(self, keys):
+        """Списки миниатюр из хранилища sorl, где может встретиться
+        один из ключей keys: [(ключ исходной картинки, ключи миниатюр)]."""
+        kvstore = default.kvstore
+        if not isinstance(kvstore, KVStore):
+            return [
+                (key, kvstore._get(key, identity='thumbnails') or [])
+                for key in kvstore._find_keys(identity='thumbnails')
+            ]
+        prefix = add_prefix('', 'thumbnails')
+        lists = []
+        # Условие из сотен LIKE упирается в предел глубины выражения
+        # SQLite, поэтому ключи ищутся частями.
+        for start in range(0, len(keys), KEYS_PER_QUERY):
+            part = keys[start:start + KEYS_PER_QUERY]
+            rows = KVStoreModel.objects.filter(
+                reduce(or_, (Q(value__contains=key) for key in part)),
+                key__startswith=prefix,
+            ).values_list('key', 'value')
+            lists.extend(
+                (key[len(prefix):], json.loads(value)) for key, value in rows
+            )
+        return lists
+
+    def live_thumbnails(self, names):
+        """Миниатюры из names, которые хранилище sorl числит за ещё
+        нужными картинками, с любыми размерами и форматами."""
+        files = {}
+        for name in names:
+            # name@2x.jpg хранится в sorl под записью name.jpg.
+            key = ImageFile(RESOLUTION_SUFFIX.sub('', name),
+                            default.storage).key
+            files.setdefault(key, []).append(name)
+        owners = {}
+        for source_key, keys in self.thumbnail_lists(list(files)):
+            source = default.kvstore._get(source_key)
+            if source is None:
+                continue
+            owners.setdefault(source.name, []).extend(
+                name for key in keys for name in files.get(key, ())
+            )
+        return {
+            name
+            for source in self.referenced(list(owners))
+            for name in owners[source]
+        }
+
+    def orphans(self, batch):
+        """Файлы пачки без ссылок: [(имя, размер)]."""
+        young = time.time() - self.options['min_age']
+        names = [name for name, entry in batch]
+        referenced = self.referenced(names)
+        cached = [
+            name for name in names
+            if name.startswith(self.cache_root + '/')
+        ]
+        if cached:
+            referenced |= self.live_thumbnails(cached)
+        orphans = []
+        for name, entry in batch:
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > young or name in referenced:
+                continue
+            orphans.append((name, stat.st_size))
+        return orphans
+
+    def delete(self, orphans):
+        for name, _ in orphans:
+            if name.startswith(self.cache_root + '/'):
+                image = ImageFile(name, default.storage)
+            else:
+                image = ImageFile(name, self.storage)
+                ImageBlob.objects.filter(name=name, refs=0).delete()
+            # Записи sorl о файле и список миниатюр исходной картинки;
+            # сами миниатюры удалит обход каталога миниатюр.
+            default.kvstore.delete(image, delete_thumbnails=False)
+            default.kvstore._delete(image.key, identity='thumbnails')
+            image.delete()
+            self.remove_empty_dirs(os.path.dirname(name))
+
+    def remove_empty_dirs(self, directory):
+        while directory not in ('', self.images_root, self.cache_root):
+            try:
+                os.rmdir(os.path.join(settings.MEDIA_ROOT, directory))
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import UnidentifiedImageError
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from posts import blobs, thumbnails
+from posts.caching import invalidate_all
+from posts.images import strip_exif
+from posts.models import Post
+from posts.storage import is_blob
+
+
+def generate(name):
+    try:
+        return thumbnails.generate(name)
+    finally:
+        close_old_connections()
+
+
+def strip(name):
+    """Убирает EXIF из сохранённой картинки.
+
+    Очищенная картинка — другое содержимое и потому другой файл в
+    ContentAddressedStorage: все посты со старым файлом переводятся на
+    новый, ссылки ImageBlob переносятся, а старый файл удаляется после
+    коммита, если на него больше никто не ссылается.
+    """
+    storage = Post._meta.get_field('image').storage
+    try:
+        with storage.open(name) as file:
+            content = strip_exif(file)
+    except (OSError, UnidentifiedImageError):
+        return False
+    if content is None:
+        return False
+    new_name = storage.save(name, ContentFile(content))
+    if new_name == name:
+        return False
+    with transaction.atomic():
+        moved = Post.objects.filter(image=name).update(
+            image=new_name, updated=timezone.now()
+        )
+        blobs.acquire(new_name, moved)
+        if is_blob(name):
+            blobs.release(name, moved)
+        else:
+            # Файл до хранилища по содержимому принадлежал одному посту.
+            transaction.on_commit(
+                lambda: delete_with_thumbnails(ImageFile(name, storage))
+            )
+    return True
+
+
+def fill_placeholders():
+    """Размеры и заглушки картинок постов, сохранённых до их появления.
+
+    Возвращает число обновлённых постов.
+    """
+    posts = (
+        Post.objects.exclude(image='').exclude(image__isnull=True)
+        .filter(image_placeholder='')
+    )
+    filled = 0
+    names = posts.order_by().values_list('image', flat=True).distinct()
+    for name in list(names):
+        post = Post(image=name)
+        thumbnails.fill_placeholder(post)
+        if post.image_placeholder:
+            filled += posts.filter(image=name).update(
+                image_width=post.image_width,
+                image_height=post.image_height,
+                image_placeholder=post.image_placeholder,
+                updated=timezone.now(),
+            )
+    if filled:
+        invalidate_all()
+    return filled
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт недостающие миниатюры картинок всех постов вместе с '
+        'адаптивными вариантами и заглушками; с --strip-exif сначала '
+        'убирает EXIF из картинок, загруженных до появления этой обработки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--strip-exif', action='store_true')
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='').exclude(image__isnull=True)
+            .order_by().values_list('image', flat=True).distinct()
+        )
+        if options['strip_exif']:
+            stripped = sum(map(strip, names))
+            self.stdout.write(f'Картинок без EXIF: {stripped}.')
+            if stripped:
+                invalidate_all()
+                names = list(
+                    Post.objects.exclude(image='')
+                    .exclude(image__isnull=True)
+                    .order_by().values_list('image', flat=True).distinct()
+                )
+        self.stdout.write(f'Заполнено заглушек: {fill_placeholders()}.')
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(options['workers']) as executor:
+                created = sum(executor.map(generate, names))
+        else:
+            created = sum(map(thumbnails.generate, names))
+        self.stdout.write(
+            self.style.SUCCESS(f'Создано миниатюр: {created}.')
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново заполняет полнотекстовый индекс постов. Нужен, если '
+        'тексты менялись в обход сигналов (QuerySet.update, raw SQL).'
+    )
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано постов: {indexed}.')
+        )
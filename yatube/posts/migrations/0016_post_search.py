@@ -0,0 +1,33 @@
+from django.db import migrations
+
+CREATE_SQL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5('
+    "text, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+
+def create_index(apps, schema_editor):
+    # FTS5 есть только в SQLite; в других базах поиск идёт через icontains.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(
+        'INSERT INTO posts_post_fts (rowid, text) '
+        'SELECT id, text FROM posts_post'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_image_placeholders'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
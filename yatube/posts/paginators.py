@@ -0,0 +1,113 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(moment, pk):
+    """Упаковывает позицию (дата, id) в непрозрачный токен для URL."""
+    raw = json.dumps([moment.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для испорченного токена возвращает None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        moment, pk = json.loads(raw.decode())
+        moment = parse_datetime(moment)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if moment is None or not isinstance(pk, int):
+        return None
+    return moment, pk
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации: без общего числа записей."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинация по ключу (field, tiebreak) от новых записей к старым.
+
+    Каждая страница выбирается диапазонным запросом по индексу
+    `(field, tiebreak)`, поэтому её стоимость не зависит от глубины,
+    в отличие от `OFFSET` в `django.core.paginator.Paginator`.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date',
+                 tiebreak='pk'):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.field = field
+        self.tiebreak = tiebreak
+
+    def _position(self, obj):
+        return encode_cursor(
+            getattr(obj, self.field), getattr(obj, self.tiebreak)
+        )
+
+    def _slice(self, queryset, cursor, older):
+        moment, pk = cursor
+        lookup = 'lt' if older else 'gt'
+        return queryset.filter(
+            Q(**{f'{self.field}__{lookup}': moment})
+            | Q(**{self.field: moment, f'{self.tiebreak}__{lookup}': pk})
+        )
+
+    def get_page(self, after=None, before=None):
+        """Возвращает страницу после курсора `after` или перед `before`."""
+        after, before = decode_cursor(after), decode_cursor(before)
+        newest_first = (f'-{self.field}', f'-{self.tiebreak}')
+        oldest_first = (self.field, self.tiebreak)
+        if before is not None:
+            queryset = self._slice(self.object_list, before, older=False)
+            rows = list(queryset.order_by(*oldest_first)[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_newer, has_older = has_more, True
+        else:
+            queryset = self.object_list
+            if after is not None:
+                queryset = self._slice(queryset, after, older=True)
+            rows = list(queryset.order_by(*newest_first)[:self.per_page + 1])
+            has_older = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_newer = after is not None
+        if not rows:
+            return CursorPage([])
+        return CursorPage(
+            rows,
+            next_cursor=self._position(rows[-1]) if has_older else None,
+            previous_cursor=self._position(rows[0]) if has_newer else None,
+        )
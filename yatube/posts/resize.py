@@ -0,0 +1,203 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from core.timing import timed
+from .models import Post
+from .storage import is_blob
+
+# Вариант картинки в URL: 960x339-crop.webp, 480x0.jpeg (высота 0 —
+# по пропорциям оригинала).
+SPEC = re.compile(r'^(\d+)x(\d+)(-crop)?\.(jpeg|png|webp|gif)$')
+CONTENT_TYPES = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'gif': 'image/gif',
+}
+# Форматы, которые сохраняют прозрачность.
+ALPHA_FORMATS = {'png', 'webp'}
+# Как отдавать ответы: содержимое по URL никогда не меняется.
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+Resized = namedtuple('Resized', 'url width height')
+
+_signer = signing.Signer(salt='posts.resize')
+
+
+def spec(width, height, crop, format_):
+    return f'{width}x{height or 0}{"-crop" if crop else ""}.{format_}'
+
+
+def parse_spec(value):
+    """(ширина, высота, обрезать, формат) или None, если spec неверен."""
+    match = SPEC.match(value)
+    if match is None:
+        return None
+    width, height = int(match[1]), int(match[2])
+    limit = settings.POSTS_RESIZE_MAX_SIZE
+    if not 0 < width <= limit or not 0 <= height <= limit:
+        return None
+    if match[3] and not height:
+        return None
+    return width, height, bool(match[3]), match[4]
+
+
+def signature(value, name):
+    return _signer.signature(f'{value}/{name}')
+
+
+def url(name, width, height, crop=False, format_='jpeg'):
+    """Подписанный URL уменьшенной картинки: без подписи вариант не
+    отдаётся, так что размеры задают только шаблоны."""
+    value = spec(width, height, crop, format_)
+    return reverse('posts:resized_image', kwargs={
+        'signature': signature(value, name), 'spec': value, 'name': name,
+    })
+
+
+def etag(name, value):
+    """Сильный ETag варианта.
+
+    Имена в ContentAddressedStorage — хеши содержимого, так что вариант
+    определяется именем и spec. Для старых имён добавляется время
+    изменения оригинала.
+    """
+    key = f'{name}\0{value}'
+    if not is_blob(name):
+        storage = Post._meta.get_field('image').storage
+        key += f'\0{storage.get_modified_time(name).timestamp()}'
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+@timed('thumb')
+def render(name, width, height, crop, format_):
+    """Уменьшает оригинал name и возвращает байты варианта."""
+    storage = Post._meta.get_field('image').storage
+    with storage.open(name) as source, Image.open(source) as image:
+        # JPEG декодируется сразу в уменьшенном виде, если это возможно.
+        # Поворот по EXIF ещё впереди, поэтому запас по обеим сторонам.
+        image.draft('RGB', (max(width, height),) * 2)
+        image = ImageOps.exif_transpose(image)
+        if crop:
+            image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            image = image.copy()
+            image.thumbnail(
+                (width, height or image.height), Image.LANCZOS
+            )
+        alpha = image.mode in ('RGBA', 'LA', 'PA') or (
+            image.mode == 'P' and 'transparency' in image.info
+        )
+        if format_ in ALPHA_FORMATS and alpha:
+            image = image.convert('RGBA')
+        elif format_ != 'gif' or image.mode not in ('P', 'L'):
+            image = image.convert('RGB')
+        content = BytesIO()
+        params = {'quality': 85} if format_ in ('jpeg', 'webp') else {}
+        image.save(content, format_.upper(), optimize=True, **params)
+    return content.getvalue()
+
+
+class DiskCache:
+    """Готовые варианты на диске с вытеснением давно не читанных (LRU),
+    когда общий размер превысил max_bytes.
+
+    Время последнего чтения — mtime файла: atime часто не ведётся.
+    Размер кеша считается приблизительно в памяти процесса и
+    пересчитывается по диску при каждом вытеснении, поэтому кеш могут
+    делить несколько процессов.
+    """
+
+    # Обновлять mtime при чтении не чаще, чем раз в столько секунд.
+    TOUCH_INTERVAL = 60 * 60
+    # Вытеснение освобождает место с запасом, до этой доли max_bytes.
+    LOW_WATER = 0.9
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = None
+        self.lock = threading.Lock()
+
+    def path(self, key, format_):
+        return os.path.join(self.directory, key[:2], f'{key}.{format_}')
+
+    def get(self, key, format_):
+        """Путь к готовому варианту или None."""
+        path = self.path(key, format_)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        if time.time() - mtime > self.TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+        return path
+
+    def set(self, key, format_, content):
+        path = self.path(key, format_)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path), delete=False
+        ) as temporary:
+            temporary.write(content)
+        os.replace(temporary.name, path)
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, _, size in self.files())
+            else:
+                self.size += len(content)
+            if self.size > self.max_bytes:
+                self.evict()
+        return path
+
+    def files(self):
+        """[(mtime, путь, размер)] всех файлов кеша."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for filename in names:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+        return files
+
+    def evict(self):
+        files = sorted(self.files())
+        self.size = sum(size for _, _, size in files)
+        target = self.max_bytes * self.LOW_WATER
+        for _, path, size in files:
+            if self.size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+
+_caches = {}
+
+
+def disk_cache():
+    directory = settings.POSTS_RESIZE_CACHE_DIR
+    if directory not in _caches:
+        _caches[directory] = DiskCache(
+            directory, settings.POSTS_RESIZE_CACHE_MAX_BYTES
+        )
+    return _caches[directory]
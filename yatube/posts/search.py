@@ -0,0 +1,134 @@
+import re
+
+from django.db import connection
+
+from .models import Post
+
+# Полнотекстовый индекс постов: виртуальная таблица FTS5 SQLite, rowid —
+# id поста. Создаётся миграцией 0016 и поддерживается сигналами Post.
+TABLE = 'posts_post_fts'
+CREATE_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+    "text, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+MATCH_SQL = f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+COUNT_SQL = f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s'
+# rank — bm25 по умолчанию: чем меньше, тем релевантнее.
+RANKED_SQL = MATCH_SQL + ' ORDER BY rank LIMIT %s OFFSET %s'
+# Чтобы отсортировать по rank, bm25 считается для каждого совпадения.
+# Если совпадений больше RANK_LIMIT, выдаём новые посты первыми: такой
+# порядок FTS5 читает прямо из индекса.
+RANK_LIMIT = 10_000
+NEWEST_SQL = MATCH_SQL + ' ORDER BY rowid DESC LIMIT %s OFFSET %s'
+
+WORD = re.compile(r'\w+')
+
+
+def available():
+    """FTS5 есть только в SQLite: в других базах ищем через icontains."""
+    return connection.vendor == 'sqlite'
+
+
+def match_query(query):
+    """Запрос пользователя в синтаксисе FTS5: все слова, каждое как
+    префикс. Кавычки, скобки и операторы из запроса не попадают."""
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def index(post):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text]
+        )
+
+
+def unindex(pk):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild():
+    """Заполняет индекс заново по всем постам. Возвращает их число."""
+    if not available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_SQL)
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) '
+            f'SELECT id, text FROM {Post._meta.db_table}'
+        )
+        indexed = cursor.rowcount
+        # Слить сегменты индекса в один: так поиск быстрее.
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return indexed
+
+
+def filter_posts(queryset, query):
+    """Посты queryset, подходящие под запрос, без ранжирования."""
+    if not available():
+        return queryset.filter(text__icontains=query)
+    match = match_query(query)
+    if not match:
+        return queryset.none()
+    # pk__in=RawSQL(...) здесь не годится: Django берёт подзапрос во
+    # вторые скобки, и SQLite читает из него только первую строку.
+    return queryset.extra(
+        where=[f'{Post._meta.db_table}.id IN ({MATCH_SQL})'], params=[match]
+    )
+
+
+class SearchResults:
+    """Посты по запросу, самые релевантные первыми (при очень многих
+    совпадениях — самые новые, см. RANK_LIMIT).
+
+    Для Paginator: count() считает совпадения в индексе, срез читает
+    из индекса только id нужной страницы и затем сами посты.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.match = match_query(query)
+        self.queryset = Post.objects.select_related('author', 'group')
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if not self.match:
+                self._count = 0
+            elif not available():
+                self._count = self.fallback().count()
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(COUNT_SQL, [self.match])
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def fallback(self):
+        return self.queryset.filter(text__icontains=self.query)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop = item.start or 0, item.stop
+        if stop is None:
+            stop = self.count()
+        if not self.match or stop <= start:
+            return []
+        if not available():
+            return list(self.fallback()[start:stop])
+        sql = RANKED_SQL if self.count() <= RANK_LIMIT else NEWEST_SQL
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.match, stop - start, start])
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,165 @@
+from django.conf import settings
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import (
+    autocomplete, blobs, caching, counters, search, thumbnails, timelines,
+)
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def touch_posts(**lookups):
+    """Сдвигает Post.updated, чтобы сбросить кеш карточек постов."""
+    Post.objects.filter(**lookups).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+    elif update_fields is None or set(update_fields) - {'last_login'}:
+        # Могло смениться имя автора, которое выводится в карточках.
+        touch_posts(author=instance)
+        caching.invalidate_all()
+    else:
+        return
+    autocomplete.update_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    autocomplete.remove('user', instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, update_fields, **kwargs):
+    # Прежний файл картинки нужен, чтобы отпустить его после замены.
+    instance._previous_image = instance.image.name or None
+    # Загруженное содержимое — чтобы восстановить файл (см. blobs.acquire).
+    instance._upload = (
+        instance.image.file
+        if instance.image and not instance.image._committed else None
+    )
+    # Страницы, где пост выводился до правки: автор и группа могли смениться.
+    instance._previous_scopes = ()
+    if instance.pk is None:
+        instance._previous_image = None
+    elif update_fields is None or {'image', 'author', 'group'} & set(
+        update_fields
+    ):
+        previous = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('image', 'author__username', 'group__slug')
+            .first()
+        )
+        if previous is None:
+            instance._previous_image = None
+        else:
+            image, username, group_slug = previous
+            instance._previous_image = image or None
+            instance._previous_scopes = caching.page_scopes(
+                username, group_slug
+            )
+    if update_fields is None or 'image' in update_fields:
+        # Размеры и заглушка считаются один раз, при смене картинки;
+        # у старых постов — при первом сохранении.
+        changed = (instance.image.name or None) != instance._previous_image
+        if changed or (instance.image and not instance.image_placeholder):
+            thumbnails.fill_placeholder(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    image = instance.image.name or None
+    if image != instance._previous_image:
+        blobs.acquire(image, content=instance._upload)
+        blobs.release(instance._previous_image)
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        timelines.fan_out(instance)
+    caching.invalidate_post(instance, instance._previous_scopes)
+    search.index(instance)
+    # Миниатюры нужны только новой картинке; с POSTS_THUMBNAIL_VIEW они
+    # создаются по первому запросу.
+    if (image and image != instance._previous_image
+            and not settings.POSTS_THUMBNAIL_VIEW):
+        thumbnails.schedule(image)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.unindex(instance.pk)
+    blobs.release(instance.image.name)
+    counters.bump_user(instance.author_id, posts_count=-1)
+    caching.invalidate_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created and instance.post_id is not None:
+        counters.bump_post(instance.post_id, 1)
+        caching.invalidate_post(instance.post)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        counters.bump_post(instance.post_id, -1)
+        caching.invalidate_post(instance.post)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changing(sender, instance, **kwargs):
+    touch_posts(group=instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, signal, **kwargs):
+    caching.invalidate_all()
+    if signal is post_delete:
+        autocomplete.remove('group', instance.pk)
+    else:
+        autocomplete.update_group(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+        timelines.backfill(instance.user_id, instance.author_id)
+        caching.invalidate_profile(instance.author.username)
+
+
+@receiver(pre_delete, sender=Follow)
+def follow_deleting(sender, instance, **kwargs):
+    # При удалении queryset'ом post_delete приходят, когда удалены уже
+    # все строки: число подписчиков до удаления запоминаем заранее.
+    instance._followers_before = timelines.followers_count(
+        instance.author_id
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    caching.invalidate_profile(instance.author.username)
+    # Подписка могла быть продублирована: ленту чистим по последней.
+    still_following = Follow.objects.filter(
+        user_id=instance.user_id, author_id=instance.author_id
+    ).exists()
+    if still_following:
+        return
+    timelines.prune(instance.user_id, instance.author_id)
+    # Автор опустился ниже порога — неважно, на одного подписчика или
+    # сразу на нескольких.
+    threshold = settings.POSTS_CELEBRITY_FOLLOWERS
+    before = getattr(instance, '_followers_before', threshold)
+    if before >= threshold > timelines.followers_count(instance.author_id):
+        timelines.demote(instance.author_id)
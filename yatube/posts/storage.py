@@ -0,0 +1,69 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def blob_name(directory, digest, extension):
+    """Имя файла по хешу содержимого, разложенное по подкаталогам."""
+    return posixpath.join(
+        directory, digest[:2], digest[2:4], digest + extension.lower()
+    )
+
+
+def is_blob(name):
+    return bool(name) and BLOB_NAME.search(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются по SHA-256 содержимого: одинаковые загрузки
+    хранятся одним файлом. Каталог из upload_to сохраняется, внутри
+    него файлы раскладываются по двум уровням подкаталогов из первых
+    символов хеша, чтобы ни один каталог не разрастался.
+
+    Хранилище не удаляет файлы само: когда файл больше не нужен,
+    решают счётчики ссылок ImageBlob (см. posts/blobs.py).
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя означает одинаковое содержимое: суффиксы не нужны.
+        return name
+
+    def blob_name(self, name, content):
+        """Имя, под которым content будет сохранён вместо name."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = posixpath.split(name)
+        if is_blob(name):
+            # Повторное сохранение под готовым именем: без новых
+            # подкаталогов.
+            directory = posixpath.dirname(posixpath.dirname(directory))
+        return blob_name(
+            directory, digest.hexdigest(), os.path.splitext(filename)[1]
+        )
+
+    def _save(self, name, content):
+        name = self.blob_name(name, content)
+        if self.exists(name):
+            return name
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись через временный файл и атомарную замену: параллельная
+        # загрузка того же содержимого не увидит недописанный файл.
+        with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path), delete=False
+        ) as temporary:
+            for chunk in content.chunks():
+                temporary.write(chunk)
+        # Временный файл создаётся с правами 0600.
+        os.chmod(temporary.name, self.file_permissions_mode or 0o644)
+        os.replace(temporary.name, path)
+        return name
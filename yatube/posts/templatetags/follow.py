@@ -0,0 +1,12 @@
+from django import template
+
+from ..models import Follow
+
+register = template.Library()
+
+
+@register.simple_tag
+def is_following(user, author):
+    return user.is_authenticated and Follow.objects.filter(
+        user=user, author=author
+    ).exists()
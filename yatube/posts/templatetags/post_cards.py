@@ -0,0 +1,43 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from posts.thumbnails import lookup_many, specs
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+
+
+def card_key(post):
+    # updated сдвигается и при смене имени автора или группы поста.
+    return f'post_card:{post.pk}:{post.updated.timestamp()}'
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Карточки постов страницы: кеш читается одним get_many,
+    рендерятся только промахи."""
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    card_template = get_template(CARD_TEMPLATE)
+    thumbnails = {}
+    if not settings.POSTS_THUMBNAIL_VIEW:
+        thumbnails = lookup_many(
+            [post.image.name for key, post in zip(keys, posts)
+             if key not in cards and post.image],
+            specs('card')
+        )
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            missing[key] = card_template.render(
+                {'post': post, 'thumbnails': thumbnails}
+            )
+    if missing:
+        cache.set_many(missing, settings.POSTS_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [(post, mark_safe(cards[key])) for key, post in zip(keys, posts)]
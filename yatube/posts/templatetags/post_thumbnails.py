@@ -0,0 +1,72 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+from posts.resize import Resized
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, image, alias='card'):
+    """Готовая миниатюра картинки, а пока её нет — сама картинка.
+
+    Миниатюры, заранее найденные для всей страницы, берутся из
+    переменной контекста `thumbnails` (см. thumbnails.lookup_many).
+    С POSTS_THUMBNAIL_VIEW — подписанный URL posts:resized_image.
+    """
+    if not image:
+        return None
+    if settings.POSTS_THUMBNAIL_VIEW:
+        return thumbnails.resized(image.name, alias)
+    prefetched = context.get('thumbnails') or {}
+    if (image.name, alias) in prefetched:
+        thumbnail = prefetched[image.name, alias]
+    else:
+        thumbnail = thumbnails.lookup(image.name, alias)
+    if thumbnail is None:
+        thumbnails.schedule(image.name)
+        # Размеры оригинала не читаем: для этого пришлось бы открыть файл.
+        return Resized(image.url, None, None)
+    return thumbnail
+
+
+@register.simple_tag(takes_context=True)
+def post_sources(context, image, alias='card'):
+    """Готовые адаптивные варианты миниатюры для <source>:
+    [(MIME-тип, srcset)] по форматам, лучший формат первым."""
+    if not image:
+        return []
+    keys = thumbnails.variants(alias, image.instance.image_width)
+    if settings.POSTS_THUMBNAIL_VIEW:
+        prefetched = {
+            (image.name, key): thumbnails.resized(image.name, key)
+            for key in keys
+        }
+    else:
+        prefetched = _prefetched(context, image, keys)
+    srcsets = {}
+    for key in keys:
+        variant = prefetched[image.name, key]
+        if variant is None:
+            continue
+        _, width, format_ = key
+        # Ширина из записи sorl о готовом файле, а не из настроек: у
+        # старых постов image_width не заполнен, и маленькая картинка
+        # не отсеивается заранее. Варианты одной ширины — один файл.
+        width = variant.width or width
+        srcsets.setdefault(format_, {}).setdefault(width, variant.url)
+    return [
+        (
+            thumbnails.MIME_TYPES[format_],
+            ', '.join(f'{url} {width}w' for width, url in srcset.items()),
+        )
+        for format_, srcset in srcsets.items()
+    ]
+
+
+def _prefetched(context, image, keys):
+    prefetched = context.get('thumbnails') or {}
+    if not all((image.name, key) in prefetched for key in keys):
+        prefetched = thumbnails.lookup_many([image.name], keys)
+    return prefetched
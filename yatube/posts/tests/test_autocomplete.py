@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import autocomplete
+from ..models import Group
+
+User = get_user_model()
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leo = User.objects.create_user(
+            username='leo', first_name='Лев', last_name='Толстой'
+        )
+        self.group = Group.objects.create(
+            title='Лесные звери', slug='forest', description='Про лес'
+        )
+
+    def labels(self, prefix):
+        return [item['label'] for item in autocomplete.search(prefix)]
+
+    def test_prefixes_of_names_and_titles(self):
+        self.assertEqual(self.labels('LE'), ['Лев Толстой'])
+        self.assertEqual(self.labels('тол'), ['Лев Толстой'])
+        self.assertEqual(self.labels('зве'), ['Лесные звери'])
+        self.assertEqual(self.labels('for'), ['Лесные звери'])
+        self.assertEqual(self.labels('ле'), ['Лев Толстой', 'Лесные звери'])
+        self.assertEqual(self.labels(' '), [])
+
+    def test_lookup_needs_no_queries_once_loaded(self):
+        autocomplete.search('л')
+        with self.assertNumQueries(0):
+            autocomplete.search('лев')
+
+    def test_index_follows_changes(self):
+        autocomplete.search('л')
+        self.leo.first_name = 'Николай'
+        self.leo.save()
+        self.group.delete()
+        User.objects.create_user(username='lermontov')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('ле'), [])
+            self.assertEqual(self.labels('ler'), ['lermontov'])
+            self.assertEqual(self.labels('ник'), ['Николай Толстой'])
+
+    def test_other_process_change_reloads_index(self):
+        autocomplete.search('л')
+        User.objects.filter(pk=self.leo.pk).update(username='lion')
+        cache.incr('version:' + autocomplete.SCOPE)
+        self.assertEqual(
+            autocomplete.search('li')[0]['username'], 'lion'
+        )
+
+    def test_json_response(self):
+        response = self.client.get(reverse('posts:autocomplete'), {'q': 'л'})
+        self.assertEqual(response.json(), {'results': [
+            {
+                'type': 'user',
+                'label': 'Лев Толстой',
+                'username': 'leo',
+                'url': reverse('posts:profile', args=['leo']),
+            },
+            {
+                'type': 'group',
+                'label': 'Лесные звери',
+                'slug': 'forest',
+                'url': reverse('posts:group_list', args=['forest']),
+            },
+        ]})
@@ -0,0 +1,155 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.budgets import QueryBudgetExceeded, exempt, query_budget
+from .. import search, urls
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise')
+class QueryBudgetTests(TestCase):
+    """Каждое представление укладывается в свой бюджет запросов и при
+    10 строках, и при 1000 (см. QueryBudget1000Tests)."""
+
+    rows = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        # bulk_create в SQLite не проставляет id: перечитываем объекты.
+        User.objects.bulk_create(
+            User(username=f'user{i}') for i in range(cls.rows)
+        )
+        users = list(User.objects.filter(username__startswith='user'))
+        UserStats.objects.bulk_create(UserStats(user=user) for user in users)
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group-{i}', description='')
+            for i in range(cls.rows)
+        )
+        groups = list(Group.objects.order_by('pk'))
+        cls.group = groups[0]
+        Post.objects.bulk_create(
+            Post(author=user, group=group, text=f'Котик {i}')
+            for i, (user, group) in enumerate(zip(users, groups))
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=group, text='Пост автора')
+            for group in groups
+        )
+        Post.objects.bulk_create(
+            Post(author=users[i], group=cls.group, text='Пост группы')
+            for i in range(cls.rows)
+        )
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=user, text='Коммент')
+            for user in users
+        )
+        Follow.objects.bulk_create(
+            Follow(user=cls.reader, author=user) for user in users
+        )
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(
+                user=cls.reader, post=post, author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for post in Post.objects.filter(author__in=users)
+        )
+        search.rebuild()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def cases(self):
+        post_id = self.post.pk
+        return [
+            (self.client, 'get', reverse('posts:index'), {}),
+            (self.client, 'get', reverse('posts:search'), {'q': 'котик'}),
+            (self.client, 'get', reverse('posts:autocomplete'), {'q': 'us'}),
+            (self.client, 'get',
+             reverse('posts:group_list', args=[self.group.slug]), {}),
+            (self.client, 'get',
+             reverse('posts:profile', args=[self.author.username]), {}),
+            (self.client, 'get',
+             reverse('posts:post_detail', args=[post_id]), {}),
+            (self.client, 'get',
+             reverse('posts:post_comments', args=[post_id]), {}),
+            (self.client, 'get', reverse('posts:post_create'), {}),
+            (self.client, 'post', reverse('posts:post_create'),
+             {'text': 'Новый пост', 'group': self.group.pk}),
+            (self.author_client, 'get',
+             reverse('posts:post_edit', args=[post_id]), {}),
+            (self.author_client, 'post',
+             reverse('posts:post_edit', args=[post_id]),
+             {'text': 'Исправленный пост', 'group': self.group.pk}),
+            (self.client, 'post',
+             reverse('posts:add_comment', args=[post_id]),
+             {'text': 'Ещё коммент'}),
+            (self.client, 'get', reverse('posts:follow_index'), {}),
+            (self.client, 'get',
+             reverse('posts:profile_follow', args=[self.author.username]),
+             {}),
+            (self.client, 'get',
+             reverse('posts:profile_unfollow', args=[self.author.username]),
+             {}),
+            (self.client, 'get',
+             reverse('posts:resized_image', args=['bad', '1x1.png', 'a']),
+             {}),
+        ]
+
+    def test_views_within_budget(self):
+        """Превышение бюджета поднимает QueryBudgetExceeded в тесте."""
+        for client, method, url, data in self.cases():
+            with self.subTest(url=url, method=method):
+                response = getattr(client, method)(url, data)
+                self.assertLess(response.status_code, 500)
+
+    def test_every_view_has_budget(self):
+        for pattern in urls.urlpatterns:
+            with self.subTest(view=pattern.name):
+                self.assertTrue(hasattr(pattern.callback, 'query_budget'))
+
+
+class QueryBudget1000Tests(QueryBudgetTests):
+    rows = 1000
+
+
+class QueryBudgetDecoratorTests(TestCase):
+    def view(self, request):
+        list(User.objects.all())
+        list(Group.objects.all())
+
+    def test_exceeded_budget(self):
+        request = mock.Mock(path='/test/')
+        view = query_budget(1)(self.view)
+        with override_settings(QUERY_BUDGET_ACTION='raise'):
+            with self.assertRaises(QueryBudgetExceeded):
+                view(request)
+        with override_settings(QUERY_BUDGET_ACTION='log'):
+            with self.assertLogs('core.budgets', 'WARNING'):
+                view(request)
+        with override_settings(QUERY_BUDGET_ACTION=None):
+            view(request)
+        query_budget(2)(self.view)(request)
+
+    def test_exempt_queries_not_counted(self):
+        request = mock.Mock(path='/test/')
+
+        def view(request):
+            list(User.objects.all())
+            with exempt():
+                self.view(request)
+
+        with override_settings(QUERY_BUDGET_ACTION='raise'):
+            query_budget(1)(view)(request)
@@ -0,0 +1,99 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import timelines
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        Post.objects.create(author=self.user, text='Ещё пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Коммент'
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.stats(self.user).posts_count, 2)
+        self.assertEqual(self.stats(self.user).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        comment.delete()
+        post.delete()
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        self.assertEqual(self.stats(self.user).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_post_save_keeps_comments_count(self):
+        """Сохранение поста не затирает счётчик комментариев,
+        сдвинутый после того, как пост был прочитан."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        loaded = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, author=self.reader, text='Коммент')
+        loaded.text = 'Исправленный пост'
+        loaded.save()
+        client = Client()
+        client.force_login(self.user)
+        client.post(
+            reverse('posts:post_edit', args=[post.pk]), {'text': 'Ещё раз'}
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Ещё раз')
+        self.assertEqual(post.comments_count, 1)
+
+    def test_failed_request_rolls_back_counters(self):
+        """Сбой после сдвига счётчика откатывает и его, и сам пост."""
+        client = Client()
+        client.force_login(self.user)
+        with mock.patch.object(
+            timelines, 'fan_out', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            client.post(reverse('posts:post_create'), {'text': 'Пост'})
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+
+    def test_pages_read_counters(self):
+        """Страницы берут число постов из счётчиков, без COUNT(*)."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        UserStats.objects.filter(user=self.user).update(posts_count=42)
+        client = Client()
+        response = client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, '<span >42</span>')
+        response = client.get(
+            reverse('posts:profile', kwargs={'username': self.user})
+        )
+        self.assertContains(response, 'Всего постов: 42')
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        Comment.objects.create(post=post, author=self.reader, text='Коммент')
+        UserStats.objects.filter(user=self.user).update(posts_count=42)
+        UserStats.objects.filter(user=self.reader).delete()
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
@@ -4,7 +4,7 @@ import tempfile
 from django.conf import settings
 from django.core.cache import cache
 
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 
@@ -132,3 +132,32 @@ class PostFormTests(TestCase):
             id=self.post.id
         ).exists())
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+    def test_large_image_rejected(self):
+        """Слишком большая картинка отклоняется ещё при загрузке."""
+        posts_count = Post.objects.count()
+        cases = (
+            ({'POSTS_IMAGE_MAX_BYTES': 10}, 'Файл больше'),
+            ({'POSTS_IMAGE_MAX_PIXELS': 1}, 'мегапикселей'),
+        )
+        for limits, error in cases:
+            with self.subTest(limits=limits), override_settings(**limits):
+                response = self.authorized_client.post(
+                    reverse('posts:post_create'),
+                    data={
+                        'text': 'Пост с большой картинкой',
+                        'image': SimpleUploadedFile(
+                            'big.gif', self.small_gif, 'image/gif'
+                        ),
+                    },
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                [message] = response.context['form'].errors['image']
+                self.assertIn(error, message)
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': self.uploaded},
+        )
+        self.assertEqual(Post.objects.count(), posts_count + 1)
@@ -0,0 +1,131 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core import caching
+from core.caching import flush_hits, hit_ratios
+from ..caching import group_scope
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class DonutCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=cls.fan, author=cls.author)
+        Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        # Попадания прошлых тестов, ещё не сброшенные в кеш.
+        flush_hits()
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.fan_client = Client()
+        self.fan_client.force_login(self.fan)
+
+    def test_page_shared_header_personal(self):
+        """Страница общая, а шапка у каждого пользователя своя."""
+        self.guest_client.get(reverse('posts:index'))
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+        self.assertTemplateUsed(response, 'includes/header.html')
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Тестовый пост')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Пользователь:')
+        self.assertContains(response, 'Войти')
+
+    def test_anonymous_and_logged_in_share_body(self):
+        """Гость и вошедший получают одно и то же тело страницы из кеша:
+        различаются только персональные фрагменты."""
+        def render_hole(template_name, context, request):
+            return f'<hole {template_name}>'
+
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        with mock.patch.object(caching, 'render_hole', render_hole):
+            anonymous = self.guest_client.get(url)
+            logged_in = self.reader_client.get(url)
+        self.assertTemplateNotUsed(logged_in, 'posts/index.html')
+        self.assertContains(logged_in, '<hole includes/header.html>')
+        self.assertEqual(anonymous.content, logged_in.content)
+
+    def test_follow_button_per_user(self):
+        """Кнопка подписки на закешированном профиле своя у каждого."""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertContains(self.reader_client.get(url), 'Подписаться')
+        response = self.fan_client.get(url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertContains(response, 'Отписаться')
+
+    def test_logged_in_hit_ratio_matches_anonymous(self):
+        """Вошедшие попадают в кеш так же часто, как гости."""
+        clients = {
+            'anon': [Client(), Client()],
+            'auth': [self.reader_client, self.fan_client],
+        }
+        for _ in range(5):
+            for group in ('anon', 'auth'):
+                for client in clients[group]:
+                    client.get(reverse('posts:index'))
+        report = hit_ratios()
+        hits_anon, total_anon, _ = report['index_page', 'anon']
+        hits_auth, total_auth, ratio = report['index_page', 'auth']
+        self.assertEqual((hits_anon, total_anon), (9, 10))
+        self.assertEqual((hits_auth, total_auth), (10, 10))
+        self.assertEqual(ratio, 1)
+
+    def test_hits_counted_in_process(self):
+        """Попадания не пишутся в кеш на каждый запрос, а сбрасываются
+        туда пачкой."""
+        for _ in range(3):
+            self.guest_client.get(reverse('posts:index'))
+        key = caching.STATS_KEY.format('index_page', 'anon', 'hit')
+        self.assertIsNone(cache.get(key))
+        hits, total, _ = hit_ratios()['index_page', 'anon']
+        self.assertEqual((hits, total), (2, 3))
+        self.assertEqual(cache.get(key), 2)
+
+    def test_unknown_group_version_expires(self):
+        """Версия, заведённая для несуществующей группы, не вечна."""
+        response = self.guest_client.get(
+            reverse('posts:group_list', args=['missing'])
+        )
+        self.assertEqual(response.status_code, 404)
+        shared = caches['shared']
+        key = shared.make_key(
+            caching.VERSION_KEY.format(group_scope('missing'))
+        )
+        self.assertIn(key, shared._expire_info)
+        self.assertIsNotNone(shared._expire_info[key])
+
+    def test_edit_invalidates_old_and_new_group(self):
+        """Пост, перенесённый в другую группу, пропадает со страницы
+        прежней группы и появляется на странице новой."""
+        old = Group.objects.create(title='Старая', slug='old')
+        new = Group.objects.create(title='Новая', slug='new')
+        post = Post.objects.create(
+            author=self.author, group=old, text='Переезжающий пост'
+        )
+        old_url = reverse('posts:group_list', args=[old.slug])
+        new_url = reverse('posts:group_list', args=[new.slug])
+        self.assertContains(self.guest_client.get(old_url), post.text)
+        self.assertNotContains(self.guest_client.get(new_url), post.text)
+        index_version = caching.get_versions(['posts'])
+        post = Post.objects.get(pk=post.pk)
+        post.group = new
+        post.save()
+        self.assertNotContains(self.guest_client.get(old_url), post.text)
+        self.assertContains(self.guest_client.get(new_url), post.text)
+        # Правка не сбрасывает страницы всех групп и авторов разом.
+        self.assertEqual(caching.get_versions(['posts']), index_version)
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..paginators import CursorPaginator, decode_cursor
+
+User = get_user_model()
+NUMBER_POSTS_PER_PAGE = 10
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_name')
+        cls.group = Group.objects.create(
+            title='Заголовок для тестовой группы',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create([
+            Post(text=f'Тестовый пост {i}', author=cls.author,
+                 group=cls.group)
+            for i in range(23)
+        ])
+        cls.expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_follow_each_other(self):
+        """Страницы по курсору идут подряд без пропусков и повторов."""
+        paginator = CursorPaginator(Post.objects.all(), NUMBER_POSTS_PER_PAGE)
+        seen = []
+        page = paginator.get_page()
+        self.assertFalse(page.has_previous())
+        while True:
+            seen.extend(page)
+            if not page.has_next():
+                break
+            page = paginator.get_page(after=page.next_cursor)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(page), 3)
+
+    def test_before_returns_previous_page(self):
+        """Курсор `before` возвращает предыдущую страницу целиком."""
+        paginator = CursorPaginator(Post.objects.all(), NUMBER_POSTS_PER_PAGE)
+        first = paginator.get_page()
+        second = paginator.get_page(after=first.next_cursor)
+        back = paginator.get_page(before=second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_broken_cursor_gives_first_page(self):
+        """Испорченный токен не ломает страницу."""
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        paginator = CursorPaginator(Post.objects.all(), NUMBER_POSTS_PER_PAGE)
+        page = paginator.get_page(after='not-a-cursor')
+        self.assertEqual(list(page), self.expected[:NUMBER_POSTS_PER_PAGE])
+
+    def test_feeds_accept_cursor(self):
+        """Ленты переключаются на курсорную пагинацию по `?after=`."""
+        paginator = CursorPaginator(Post.objects.all(), NUMBER_POSTS_PER_PAGE)
+        cursor = paginator.get_page().next_cursor
+        page_list = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+        ]
+        for page in page_list:
+            with self.subTest(page=page):
+                response = self.client.get(page, {'after': cursor})
+                page_obj = response.context['page_obj']
+                self.assertTrue(page_obj.is_cursor)
+                self.assertEqual(
+                    list(page_obj),
+                    self.expected[NUMBER_POSTS_PER_PAGE:
+                                  NUMBER_POSTS_PER_PAGE * 2]
+                )
+                self.assertContains(response, f'?after={page_obj.next_cursor}')
+
+    def test_cursor_mode_from_settings(self):
+        """Настройка включает курсорную пагинацию и для первой страницы."""
+        with self.settings(POSTS_CURSOR_PAGINATION=True):
+            response = self.client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.is_cursor)
+        self.assertEqual(len(page_obj), NUMBER_POSTS_PER_PAGE)
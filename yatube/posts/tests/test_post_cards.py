@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..templatetags.post_cards import card_key, post_cards
+
+User = get_user_model()
+
+
+class PostCardsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='auth', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_cached_with_one_get_many(self):
+        """Карточки берутся из кеша одним get_many, промахи рендерятся."""
+        posts = list(Post.objects.all())
+        post_cards(posts)
+        self.assertIn('Тестовый пост', cache.get(card_key(self.post)))
+        cache.set(card_key(self.post), 'из кеша')
+        with self.assertNumQueries(0):
+            cards = post_cards(posts)
+        self.assertEqual(cards, [(self.post, 'из кеша')])
+
+    def test_card_key_changes_with_post_author_and_group(self):
+        """Ключ карточки меняется при правке поста, автора и группы."""
+        changes = (
+            lambda: Post.objects.get(pk=self.post.pk).save(),
+            lambda: User.objects.get(pk=self.user.pk).save(),
+            lambda: Group.objects.get(pk=self.group.pk).save(),
+        )
+        for change in changes:
+            with self.subTest(change=change):
+                before = card_key(Post.objects.get(pk=self.post.pk))
+                change()
+                after = card_key(Post.objects.get(pk=self.post.pk))
+                self.assertNotEqual(before, after)
+
+    def test_renamed_author_shown_on_index(self):
+        """Новое имя автора сразу видно в ленте."""
+        self.client.get(reverse('posts:index'))
+        self.user.first_name = 'Алексей'
+        self.user.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Алексей Толстой')
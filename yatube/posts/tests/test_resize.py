@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import resize
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_CACHE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_png(size):
+    content = BytesIO()
+    Image.new('RGB', size, 'red').save(content, 'PNG')
+    return content.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_RESIZE_CACHE_DIR=TEMP_CACHE_DIR,
+    POSTS_THUMBNAIL_VIEW=True,
+)
+class ResizedImageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'big.png', make_png((600, 300)), 'image/png'
+            ),
+        )
+
+    def test_page_links_signed_variants(self):
+        """Страница ссылается на подписанные варианты /img/."""
+        response = self.client.get(reverse('posts:index'))
+        card = resize.url(self.post.image.name, 960, 339, True, 'jpeg')
+        webp = resize.url(self.post.image.name, 480, 170, True, 'webp')
+        self.assertContains(response, f'src="{card}"')
+        self.assertContains(response, f'{webp} 480w')
+        # Картинка уже 960: шире вариантов нет.
+        self.assertNotContains(response, '960w')
+
+    def test_variant_resized_and_cached(self):
+        """Вариант уменьшается, кешируется на диске и по ETag не
+        передаётся повторно."""
+        url = resize.url(self.post.image.name, 100, 50, True, 'webp')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        with Image.open(BytesIO(response.content)) as image:
+            self.assertEqual(image.size, (100, 50))
+        etag = response['ETag']
+        self.assertIsNotNone(
+            resize.disk_cache().get(etag.strip('"'), 'webp')
+        )
+        cached = self.client.get(url)
+        self.assertEqual(b''.join(cached.streaming_content), response.content)
+        self.assertEqual(cached['ETag'], etag)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_unsigned_variant_not_found(self):
+        url = resize.url(self.post.image.name, 100, 50, True, 'webp')
+        forged = url.replace('100x50', '4000x3000')
+        self.assertEqual(
+            self.client.get(forged).status_code, HTTPStatus.NOT_FOUND
+        )
+
+    def test_disk_cache_evicts_least_recently_used(self):
+        """Сверх лимита вытесняются давно не читанные варианты."""
+        disk = resize.DiskCache(
+            os.path.join(TEMP_CACHE_DIR, 'lru'), max_bytes=250
+        )
+        for index, key in enumerate(('aa1', 'bb2', 'cc3')):
+            path = disk.set(key, 'jpeg', b'x' * 100)
+            os.utime(path, (index, index))
+        self.assertIsNone(disk.get('aa1', 'jpeg'))
+        self.assertIsNotNone(disk.get('bb2', 'jpeg'))
+        self.assertIsNotNone(disk.get('cc3', 'jpeg'))
+        self.assertLessEqual(disk.size, 250)
@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import SearchResults, match_query
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        self.cats = Post.objects.create(
+            author=self.user, text='Котики спят. Котики едят. Котики!'
+        )
+        self.cat = Post.objects.create(
+            author=self.user, text='Один котик и много собак'
+        )
+        self.dogs = Post.objects.create(author=self.user, text='Только собаки')
+
+    def search(self, query):
+        return [post.pk for post in SearchResults(query)[:10]]
+
+    def test_results_ranked_by_relevance(self):
+        """Слова ищутся по префиксу без учёта регистра, лучшие первыми."""
+        self.assertEqual(self.search('КОТИК'), [self.cats.pk, self.cat.pk])
+        self.assertEqual(self.search('котик собак'), [self.cat.pk])
+        self.assertEqual(SearchResults('собак').count(), 2)
+
+    def test_index_follows_post_changes(self):
+        self.dogs.text = 'Теперь про котиков'
+        self.dogs.save()
+        self.cats.delete()
+        self.assertCountEqual(
+            self.search('котик'), [self.cat.pk, self.dogs.pk]
+        )
+        self.assertEqual(self.search('только'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        """Операторы и кавычки FTS5 из запроса не ломают поиск."""
+        self.assertEqual(
+            match_query('"кот" OR NEAR(*'), '"кот"* "OR"* "NEAR"*'
+        )
+        self.assertEqual(self.search('"*()'), [])
+
+    def test_search_page_paginates(self):
+        for number in range(12):
+            Post.objects.create(
+                author=self.user, text=f'Собака номер {number}'
+            )
+        response = self.client.get(reverse('posts:search'), {'q': 'собака'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, '&amp;page=2"')
+
+    def test_admin_search_uses_index(self):
+        self.client.force_login(User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        ))
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котик'}
+        )
+        self.assertEqual(
+            {post.pk for post in response.context['cl'].result_list},
+            {self.cats.pk, self.cat.pk},
+        )
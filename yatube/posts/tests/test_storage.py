@@ -0,0 +1,220 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from .. import blobs, thumbnails
+from ..counters import recount
+from ..models import ImageBlob, Post
+from ..storage import is_blob
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def make_gif(color):
+    content = BytesIO()
+    Image.new('RGB', (2, 1), color).save(content, 'GIF')
+    return content.getvalue()
+
+
+OTHER_GIF = make_gif('red')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@mock.patch.object(blobs.transaction, 'on_commit', lambda func: func())
+@mock.patch.object(thumbnails, 'schedule', lambda name: None)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content, name='small.gif'):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def refs(self, post):
+        return ImageBlob.objects.get(name=post.image.name).refs
+
+    def test_identical_uploads_stored_once(self):
+        """Одинаковые загрузки хранятся одним файлом в подкаталогах хеша."""
+        first = self.create_post(SMALL_GIF)
+        second = self.create_post(SMALL_GIF, name='copy.GIF')
+        other = self.create_post(OTHER_GIF)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertTrue(is_blob(first.image.name))
+        directory, shard1, shard2, filename = first.image.name.split('/')
+        self.assertEqual(directory, 'posts')
+        self.assertEqual(filename[:4], shard1 + shard2)
+        self.assertEqual(self.refs(first), 2)
+
+    def test_file_deleted_with_last_post(self):
+        """Файл удаляется только вместе с последним постом."""
+        first = self.create_post(SMALL_GIF)
+        second = self.create_post(SMALL_GIF)
+        path = first.image.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.refs(second), 1)
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_upload_survives_concurrent_delete(self):
+        """Файл, удалённый между его записью и учётом ссылки,
+        записывается заново из загрузки."""
+        first = self.create_post(SMALL_GIF)
+        storage = Post._meta.get_field('image').storage
+        save = type(storage)._save
+
+        def save_then_delete(storage, name, content):
+            # Загрузка застала файл, а последний пост с ним удаляется.
+            name = save(storage, name, content)
+            if first.pk is not None:
+                first.delete()
+            return name
+
+        with mock.patch.object(type(storage), '_save', save_then_delete):
+            second = self.create_post(SMALL_GIF)
+        self.assertEqual(second.image.name, first.image.name)
+        with open(second.image.path, 'rb') as file:
+            self.assertEqual(file.read(), SMALL_GIF)
+        self.assertEqual(self.refs(second), 1)
+
+    def test_replaced_image_released(self):
+        """Заменённая при редактировании картинка отпускается."""
+        post = self.create_post(SMALL_GIF)
+        path = post.image.path
+        post.image = SimpleUploadedFile('new.gif', OTHER_GIF, 'image/gif')
+        post.save()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.refs(post), 1)
+
+    def test_dedupe_existing_files(self):
+        """Старые файлы с суффиксами сливаются в один по содержимому."""
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        for name in ('small.gif', 'small_AbCdEf.gif'):
+            with open(os.path.join(TEMP_MEDIA_ROOT, 'posts', name), 'wb') as f:
+                f.write(SMALL_GIF)
+            Post.objects.create(
+                author=self.user, text='Старый пост', image=f'posts/{name}'
+            )
+        out = StringIO()
+        call_command('dedupe_images', stdout=out)
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        [name] = names
+        self.assertTrue(is_blob(name))
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 2)
+        for legacy in ('small.gif', 'small_AbCdEf.gif'):
+            self.assertFalse(os.path.exists(
+                os.path.join(TEMP_MEDIA_ROOT, 'posts', legacy)
+            ))
+        self.assertIn(f'освобождено байт: {len(SMALL_GIF)}', out.getvalue())
+
+    def test_gc_media_removes_orphans(self):
+        """Сборщик удаляет только файлы без ссылок и продолжает обход."""
+        post = self.create_post(SMALL_GIF)
+        orphans = [
+            os.path.join(TEMP_MEDIA_ROOT, 'posts', 'ab', 'cd', 'a' * 64),
+            os.path.join(TEMP_MEDIA_ROOT, 'cache', 'ef', 'gh', 'orphan.jpg'),
+        ]
+        for path in orphans:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(OTHER_GIF)
+        state = os.path.join(TEMP_MEDIA_ROOT, 'gc_state')
+        options = {
+            'min_age': 0, 'pause': 0, 'state': state, 'stdout': StringIO()
+        }
+
+        call_command('gc_media', dry_run=True, **options)
+        self.assertTrue(all(os.path.exists(path) for path in orphans))
+
+        call_command('gc_media', batch=1, max_batches=1, **options)
+        self.assertTrue(os.path.exists(state))
+        out = StringIO()
+        call_command('gc_media', **{**options, 'stdout': out})
+        self.assertFalse(any(os.path.exists(path) for path in orphans))
+        self.assertFalse(os.path.exists(os.path.dirname(orphans[1])))
+        self.assertTrue(os.path.exists(post.image.path))
+        self.assertFalse(os.path.exists(state))
+        self.assertIn('обход завершён', out.getvalue())
+
+    def test_gc_media_keeps_recorded_thumbnails(self):
+        """Миниатюра любого размера живёт, пока sorl числит её за
+        картинкой, на которую ссылается пост."""
+        post = self.create_post(make_gif('blue'))
+        thumbnail = get_thumbnail(post.image, '37x13')
+        path = thumbnail.storage.path(thumbnail.name)
+        options = {
+            'min_age': 0, 'pause': 0, 'stdout': StringIO(),
+            'state': os.path.join(TEMP_MEDIA_ROOT, 'gc_state'),
+        }
+        call_command('gc_media', **options)
+        self.assertTrue(os.path.exists(path))
+
+        Post.objects.filter(pk=post.pk).update(image='')
+        ImageBlob.objects.update(refs=0)
+        call_command('gc_media', **options)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(post.image.path))
+
+    def test_strip_exif_moves_shared_blob(self):
+        """Очистка EXIF переводит все посты общего файла на новый файл,
+        переносит ссылки и удаляет старый."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        content = BytesIO()
+        Image.new('RGB', (20, 10)).save(content, 'JPEG', exif=exif)
+        first = self.create_post(content.getvalue(), name='photo.jpg')
+        second = self.create_post(content.getvalue(), name='copy.jpg')
+        old_path = first.image.path
+        call_command(
+            'pregenerate_thumbnails', strip_exif=True, workers=1,
+            stdout=StringIO()
+        )
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_blob(first.image.name))
+        self.assertFalse(os.path.exists(old_path))
+        with Image.open(first.image.path) as image:
+            self.assertFalse(image.getexif())
+        self.assertEqual(
+            list(ImageBlob.objects.values_list('name', 'refs')),
+            [(first.image.name, 2)]
+        )
+
+    def test_recount_repairs_refs(self):
+        post = self.create_post(SMALL_GIF)
+        ImageBlob.objects.all().delete()
+        self.assertEqual(recount(), 1)
+        self.assertEqual(self.refs(post), 1)
@@ -0,0 +1,209 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from .. import thumbnails
+from ..models import Post
+from ..forms import PostForm
+from ..templatetags.post_thumbnails import post_sources, post_thumbnail
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def make_png(width, height):
+    content = BytesIO()
+    Image.new('RGB', (width, height), 'blue').save(content, 'PNG')
+    return content.getvalue()
+
+
+# Шире 480 и 960, но уже 1920: вариант 1920 не создаётся.
+PHOTO_PNG = make_png(1000, 500)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_THUMBNAIL_WORKERS=0,
+    POSTS_THUMBNAIL_VIEW=False,
+)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('photo.png', PHOTO_PNG, 'image/png'),
+        )
+
+    def test_original_served_until_thumbnail_ready(self):
+        """Пока миниатюры нет, тег отдаёт оригинал и заказывает её."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            image = post_thumbnail({}, self.post.image)
+        self.assertEqual(image.url, self.post.image.url)
+        schedule.assert_called_once_with(self.post.image.name)
+
+    def test_scheduled_only_for_new_image(self):
+        """Миниатюры заказываются при смене картинки, а не при каждой
+        правке текста."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            self.post.text = 'Новый текст'
+            self.post.save()
+            schedule.assert_not_called()
+            self.post.image = SimpleUploadedFile(
+                'other.png', make_png(10, 10), 'image/png'
+            )
+            self.post.save()
+        schedule.assert_called_once_with(self.post.image.name)
+
+    def test_generate_creates_configured_thumbnails(self):
+        """Созданная миниатюра отдаётся тегом и обновляет пост."""
+        updated = self.post.updated
+        self.assertEqual(thumbnails.generate(self.post.image.name), 3)
+        image = post_thumbnail({}, self.post.image)
+        self.assertTrue(image.url.startswith(settings.MEDIA_URL + 'cache/'))
+        self.assertEqual((image.width, image.height), (960, 339))
+        self.assertGreater(Post.objects.get(pk=self.post.pk).updated, updated)
+        self.assertEqual(thumbnails.generate(self.post.image.name), 0)
+
+    def test_sources_list_webp_variants(self):
+        """Для <picture> отдаются варианты WebP всех ширин не больше
+        ширины картинки."""
+        self.assertEqual(post_sources({}, self.post.image), [])
+        thumbnails.generate(self.post.image.name)
+        [(mime_type, srcset)] = post_sources({}, self.post.image)
+        self.assertEqual(mime_type, 'image/webp')
+        widths = [item.split()[1] for item in srcset.split(', ')]
+        self.assertEqual(widths, ['480w', '960w'])
+        variant = thumbnails.lookup(
+            self.post.image.name, ('card', 480, 'WEBP')
+        )
+        self.assertEqual((variant.width, variant.height), (480, 170))
+
+    def test_variants_do_not_upscale(self):
+        """Варианты маленькой картинки не растягиваются и не создаются
+        шире её самой."""
+        post = Post.objects.create(
+            author=self.user,
+            text='Маленькая картинка',
+            image=SimpleUploadedFile('small.png', make_png(600, 300),
+                                     'image/png'),
+        )
+        thumbnails.generate(post.image.name)
+        [(_, srcset)] = post_sources({}, post.image)
+        widths = [item.split()[1] for item in srcset.split(', ')]
+        self.assertEqual(widths, ['480w'])
+        self.assertIsNone(
+            thumbnails.lookup(post.image.name, ('card', 960, 'WEBP'))
+        )
+        _, options = thumbnails._spec(('card', 960, 'WEBP'))
+        self.assertFalse(options['upscale'])
+
+    def test_srcset_uses_generated_width(self):
+        """У старых постов без image_width в srcset попадает настоящая
+        ширина созданного варианта, а не ширина из настроек."""
+        Post.objects.filter(pk=self.post.pk).update(image_width=None)
+        post = Post.objects.get(pk=self.post.pk)
+        thumbnails.generate(post.image.name)
+        [(_, srcset)] = post_sources({}, post.image)
+        widths = [item.split()[1] for item in srcset.split(', ')]
+        self.assertEqual(widths, ['480w', '960w', '1000w'])
+
+    def test_form_strips_exif(self):
+        """Из загруженной картинки EXIF удаляется."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        content = BytesIO()
+        Image.new('RGB', (20, 10)).save(content, 'JPEG', exif=exif)
+        form = PostForm(
+            data={'text': 'Текст'},
+            files={'image': SimpleUploadedFile(
+                'photo.jpg', content.getvalue(), 'image/jpeg'
+            )},
+        )
+        self.assertTrue(form.is_valid())
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertFalse(image.getexif())
+            self.assertEqual(image.size, (20, 10))
+
+    def test_placeholder_stored_and_rendered(self):
+        """При сохранении запоминаются размеры и заглушка картинки,
+        страницы выводят её фоном миниатюры."""
+        self.assertEqual((self.post.image_width, self.post.image_height),
+                         (1000, 500))
+        self.assertTrue(
+            self.post.image_placeholder.startswith('data:image/')
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, self.post.image_placeholder)
+        # Картинка страницы поста — главный элемент экрана, её не
+        # откладываем.
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertContains(response, 'loading="eager" fetchpriority="high"')
+        self.assertNotContains(response, 'loading="lazy"')
+        Post.objects.update(image_placeholder='', image_width=None)
+        out = StringIO()
+        call_command('pregenerate_thumbnails', workers=1, stdout=out)
+        self.assertIn('Заполнено заглушек: 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_width, 1000)
+        self.assertTrue(self.post.image_placeholder)
+
+    def test_index_resolves_thumbnails_in_one_query(self):
+        """Миниатюры всей страницы ищутся в базе одним запросом."""
+        for i in range(9):
+            Post.objects.create(
+                author=self.user,
+                text=f'Пост {i}',
+                image=SimpleUploadedFile(f'{i}.gif', SMALL_GIF, 'image/gif'),
+            )
+        call_command('pregenerate_thumbnails', workers=1, stdout=StringIO())
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertEqual(
+            response.content.decode().count('src="/media/cache/'), 10
+        )
+
+    def test_command_generates_missing_thumbnails(self):
+        out = StringIO()
+        call_command('pregenerate_thumbnails', workers=1, stdout=out)
+        self.assertIn('Создано миниатюр: 3', out.getvalue())
+        self.assertIsNotNone(thumbnails.lookup(self.post.image.name, 'card'))
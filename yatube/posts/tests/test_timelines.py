@@ -0,0 +1,183 @@
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+        Post.objects.create(author=cls.stranger, text='Чужой пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def timeline(self):
+        return list(
+            TimelineEntry.objects.filter(user=self.reader)
+            .values_list('post_id', flat=True)
+        )
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        """Подписка заполняет ленту, новые посты попадают в неё сразу."""
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(self.timeline(), [new_post.pk, self.old_post.pk])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post]
+        )
+        with self.settings(POSTS_CURSOR_PAGINATION=True):
+            response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post]
+        )
+
+    def test_unfollow_and_delete_prune_timeline(self):
+        """Отписка и удаление поста чистят ленту."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый')
+        post.delete()
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+        self.client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(self.timeline(), [])
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты по подпискам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+
+    def test_migration_fills_timelines(self):
+        """Миграция, создающая ленты, заполняет их по подпискам."""
+        migration = import_module('posts.migrations.0011_timelineentry')
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            schema_editor = SimpleNamespace(
+                connection=connection, execute=cursor.execute
+            )
+            migration.fill_timelines(apps, schema_editor)
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [self.old_post])
+
+
+@override_settings(POSTS_CELEBRITY_FOLLOWERS=2)
+class HybridFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.author = User.objects.create_user(username='author')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.celebrity)
+        Follow.objects.create(user=self.fan, author=self.celebrity)
+        self.posts = [
+            Post.objects.create(author=author, text=f'Пост {i}')
+            for i, author in enumerate(
+                (self.author, self.celebrity, self.author, self.celebrity)
+            )
+        ]
+
+    def test_celebrity_posts_are_pulled(self):
+        """Посты знаменитости не рассылаются, но попадают в ленту."""
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.celebrity).exists()
+        )
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), self.posts[::-1]
+        )
+        with self.settings(POSTS_CURSOR_PAGINATION=True):
+            response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), self.posts[::-1]
+        )
+
+    def test_demoted_author_is_pushed_again(self):
+        """После потери подписчиков посты автора снова в TimelineEntry."""
+        Follow.objects.filter(user=self.fan).delete()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=self.reader, author=self.celebrity
+            ).count(),
+            2
+        )
+
+    @override_settings(POSTS_CELEBRITY_FOLLOWERS=3)
+    def test_bulk_unfollow_below_threshold_demotes(self):
+        """Автор, разом потерявший нескольких подписчиков, тоже снова
+        рассылает посты."""
+        fans = [self.fan, User.objects.create_user(username='fan2')]
+        Follow.objects.create(user=fans[1], author=self.celebrity)
+        Follow.objects.filter(author=self.celebrity, user__in=fans).delete()
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), self.posts[::-1]
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=self.reader, author=self.celebrity
+            ).count(),
+            2
+        )
+
+    @override_settings(
+        QUERY_BUDGET_ACTION='raise', POSTS_CELEBRITY_FOLLOWERS=12
+    )
+    def test_unfollow_at_threshold_stays_in_budget(self):
+        """Отписка, после которой автор перестаёт быть знаменитостью,
+        рассылает его посты всем подписчикам за постоянное число
+        запросов."""
+        User.objects.bulk_create(
+            User(username=f'fan{i}') for i in range(10)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=user, author=self.celebrity)
+            for user in User.objects.filter(username__startswith='fan')
+            .exclude(pk=self.fan.pk)
+        )
+        for i in range(20):
+            Post.objects.create(author=self.celebrity, text=f'Ещё {i}')
+        response = self.client.get(
+            reverse('posts:profile_unfollow', args=[self.celebrity.username])
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).filter(
+                author=self.celebrity
+            ).exists()
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(author=self.celebrity).count(),
+            11 * 22
+        )
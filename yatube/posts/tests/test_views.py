@@ -1,11 +1,14 @@
 import shutil
 import tempfile
+from unittest import mock
 from django import forms
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.core.cache import cache
 from django.conf import settings
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from ..models import Group, Post, Follow, Comment
@@ -184,15 +187,45 @@ class PostsViewsTests(TestCase):
         """Тест кеша страницы index."""
         response = self.authorized_client.get(reverse('posts:index'))
         first_cache = response.content
-        post = Post.objects.get(id=self.post.pk)
-        post.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         response = self.authorized_client.get(reverse('posts:index'))
         second_cache = response.content
         self.assertEqual(first_cache, second_cache)
         cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
-        third_cache = response.context['page_obj']
-        self.assertNotIn(post, third_cache)
+        self.assertContains(response, 'Без сигналов')
+
+    def test_cache_invalidated_by_post_changes(self):
+        """Изменение поста сразу сбрасывает кеш лент, где он выводится."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for page in pages:
+            self.authorized_client.get(page)
+        post = Post.objects.create(
+            author=self.user, text='Свежий пост', group=self.group
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                self.assertIn(post, response.context['page_obj'])
+        post.delete()
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                self.assertNotContains(response, 'Свежий пост')
+
+    def test_stale_page_served_while_rebuilding(self):
+        """Пока другой запрос пересобирает страницу, отдаём старую."""
+        first = self.guest_client.get(reverse('posts:index')).content
+        Post.objects.create(author=self.user, text='Свежий пост')
+        with mock.patch.object(cache, 'add', return_value=False):
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.content, first)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
 
     def test_new_post_follow_index_show_correct_context(self):
         """Шаблон follow_index сформирован с правильным контекстом."""
@@ -284,6 +317,59 @@ class PaginatorViewsTest(TestCase):
                     3)
 
 
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.post = Post.objects.create(
+            text='Пост', author=User.objects.create_user(username='author')
+        )
+        cls.users = User.objects.bulk_create(
+            User(username=f'reader{i}') for i in range(45)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def add_comments(self, count):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=author, text=f'Коммент {i}')
+            for i, author in enumerate(User.objects.all()[:count])
+        )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_comments(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.add_comments(3)
+        few = self.count_queries(url)
+        self.add_comments(40)
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_next_page_fragment(self):
+        """Страницы по 20 комментариев от новых к старым, остальное —
+        фрагментами по курсору."""
+        self.add_comments(45)
+        expected = list(Comment.objects.order_by('-created', '-pk'))
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        seen = list(response.context['comments'])
+        while response.context['comments'].has_next():
+            response = self.client.get(
+                reverse('posts:post_comments', args=[self.post.pk]),
+                {'after': response.context['comments'].next_cursor},
+            )
+            self.assertTemplateUsed(
+                response, 'posts/includes/comment_list.html'
+            )
+            seen.extend(response.context['comments'])
+        self.assertEqual(seen, expected)
+        self.assertNotContains(response, 'Показать ещё')
+
+
 class ImageTest(TestCase):
     @classmethod
     def setUpClass(cls):
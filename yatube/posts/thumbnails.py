@@ -0,0 +1,275 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from sorl.thumbnail.parsers import parse_geometry
+
+from core import budgets
+from core.timing import timed
+from . import resize
+from .caching import invalidate_post
+from .images import preview
+from .models import Post
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+# Ширина заглушки миниатюры в пикселях.
+PLACEHOLDER_WIDTH = 20
+
+
+def _source(name):
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def _options(source, options):
+    # Те же умолчания, что подставляет ThumbnailBackend.get_thumbnail:
+    # от них зависит имя файла миниатюры.
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def formats():
+    """Форматы из POSTS_THUMBNAIL_FORMATS, которые умеют Pillow и sorl."""
+    Image.init()
+    return [
+        format_ for format_ in settings.POSTS_THUMBNAIL_FORMATS
+        if format_ in EXTENSIONS and format_ in Image.SAVE
+    ]
+
+
+def variants(alias, source_width=None):
+    """Ключи адаптивных вариантов миниатюры: (alias, ширина, формат).
+
+    Варианты не увеличивают картинку, поэтому ширины больше source_width
+    (если она известна) пропускаются: в srcset они были бы неправдой.
+    """
+    return [
+        (alias, width, format_)
+        for format_ in formats()
+        for width in settings.POSTS_THUMBNAIL_WIDTHS
+        if source_width is None or width <= source_width
+    ]
+
+
+def specs(alias, source_width=None):
+    """Ключи самой миниатюры и её вариантов."""
+    return [alias, *variants(alias, source_width)]
+
+
+def _spec(key):
+    """Геометрия и параметры sorl по ключу миниатюры или варианта."""
+    if isinstance(key, str):
+        return settings.POSTS_THUMBNAILS[key]
+    alias, width, format_ = key
+    geometry, options = settings.POSTS_THUMBNAILS[alias]
+    # Вариант сохраняет пропорции миниатюры, но, в отличие от неё,
+    # не растягивает маленькую картинку.
+    base_width, base_height = parse_geometry(geometry)
+    geometry = str(width)
+    if base_height:
+        geometry += f'x{round(base_height * width / base_width)}'
+    return geometry, {**options, 'format': format_, 'upscale': False}
+
+
+def thumbnail_file(name, key):
+    """Файл миниатюры или варианта, не создавая его."""
+    geometry, options = _spec(key)
+    source = _source(name)
+    filename = default.backend._get_thumbnail_filename(
+        source, geometry, _options(source, options)
+    )
+    return ImageFile(filename, default.storage)
+
+
+@timed('thumb')
+def resized(name, key):
+    """Миниатюра или вариант через posts.views.resized_image:
+    подписанный URL, файл создаётся при первом запросе."""
+    geometry, options = _spec(key)
+    width, height = parse_geometry(geometry)
+    crop = bool(options.get('crop')) and bool(height)
+    format_ = options.get('format', sorl_settings.THUMBNAIL_FORMAT)
+    return resize.Resized(
+        resize.url(name, width, height, crop, format_.lower()),
+        width, height,
+    )
+
+
+@timed('thumb')
+def lookup(name, key):
+    """Готовая миниатюра из хранилища sorl или None."""
+    return default.kvstore.get(thumbnail_file(name, key))
+
+
+@timed('thumb')
+def lookup_many(names, keys):
+    """То же, что lookup, для многих картинок и миниатюр сразу.
+
+    Записи хранилища sorl читаются одним get_many из кеша, а промахи —
+    одним запросом к базе. Возвращает {(имя, ключ): миниатюра или None}.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        return {
+            (name, key): lookup(name, key) for name in names for key in keys
+        }
+    records = {
+        add_prefix(thumbnail_file(name, key).key): (name, key)
+        for name in set(names)
+        for key in keys
+    }
+    values = kvstore.cache.get_many(list(records))
+    missing = [record for record in records if record not in values]
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        # Как и sorl, запоминаем в кеше и отсутствие записи.
+        fetched = {record: found.get(record, EMPTY_VALUE)
+                   for record in missing}
+        kvstore.cache.set_many(
+            fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(fetched)
+    return {
+        target: (
+            None if values[record] == EMPTY_VALUE
+            else deserialize_image_file(values[record])
+        )
+        for record, target in records.items()
+    }
+
+
+def placeholder(file, alias='card'):
+    """Размеры картинки и заглушка её миниатюры alias: крошечная копия
+    с теми же пропорциями (см. images.preview)."""
+    geometry, options = settings.POSTS_THUMBNAILS[alias]
+    width, height = parse_geometry(geometry)
+    aspect = width / height if height and options.get('crop') else None
+    return preview(file, PLACEHOLDER_WIDTH, aspect)
+
+
+def fill_placeholder(post):
+    """Заполняет размеры картинки поста и заглушку её миниатюры."""
+    post.image_width = post.image_height = None
+    post.image_placeholder = ''
+    if not post.image:
+        return
+    try:
+        if post.image._committed:
+            with post.image.storage.open(post.image.name) as file:
+                size, data = placeholder(file)
+        else:
+            # Только что загруженный файл ещё не сохранён в хранилище.
+            size, data = placeholder(post.image.file)
+    except (OSError, ValueError, SuspiciousFileOperation,
+            Image.DecompressionBombError):
+        return
+    post.image_width, post.image_height = size
+    post.image_placeholder = data
+
+
+@timed('thumb')
+def generate(name):
+    """Создаёт недостающие миниатюры картинки с их вариантами
+    и обновляет её посты.
+
+    Возвращает число созданных файлов.
+    """
+    source_width = (
+        Post.objects.filter(image=name, image_width__isnull=False)
+        .values_list('image_width', flat=True).first()
+    )
+    missing = [
+        key for alias in settings.POSTS_THUMBNAILS
+        for key in specs(alias, source_width)
+        if lookup(name, key) is None
+    ]
+    source = _source(name)
+    for key in missing:
+        geometry, options = _spec(key)
+        default.backend.get_thumbnail(source, geometry, **options)
+    # sorl не бросает исключений, если картинку не удалось прочитать.
+    created = sum(lookup(name, key) is not None for key in missing)
+    if created:
+        posts = list(
+            Post.objects.select_related('author', 'group').filter(image=name)
+        )
+        # Карточки и страницы с оригиналом вместо миниатюры устарели.
+        Post.objects.filter(image=name).update(updated=timezone.now())
+        for post in posts:
+            invalidate_post(post)
+    return created
+
+
+def _run(name):
+    try:
+        generate(name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def _work(name):
+    try:
+        _run(name)
+    finally:
+        close_old_connections()
+
+
+def _in_background():
+    # Общая in-memory база SQLite (так её создают тесты) блокирует
+    # таблицы без ожидания: писать в неё из других потоков нельзя.
+    in_memory = connection.vendor == 'sqlite' and connection.is_in_memory_db()
+    return settings.POSTS_THUMBNAIL_WORKERS and not in_memory
+
+
+def _submit(name):
+    global _executor
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    if not _in_background():
+        # Фоновая работа, а не цена представления, сохранившего пост.
+        with budgets.exempt():
+            _run(name)
+        return
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.POSTS_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    _executor.submit(_work, name)
+
+
+@timed('thumb')
+def schedule(name):
+    """Создаёт миниатюры в фоне, когда картинка сохранена в базе."""
+    transaction.on_commit(lambda: _submit(name))
@@ -0,0 +1,193 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+
+from .models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 500
+FEED_ORDERING = ('-pub_date', '-post_id')
+
+
+def followers_count(author_id):
+    return (
+        Follow.objects.filter(author_id=author_id)
+        .values('user_id').distinct().count()
+    )
+
+
+def is_celebrity(author_id):
+    """Посты автора с множеством подписчиков читаются, а не рассылаются."""
+    return followers_count(author_id) >= settings.POSTS_CELEBRITY_FOLLOWERS
+
+
+def celebrity_ids(author_ids):
+    return set(
+        Follow.objects.filter(author_id__in=author_ids)
+        .values('author_id')
+        .annotate(followers=Count('user_id', distinct=True))
+        .filter(followers__gte=settings.POSTS_CELEBRITY_FOLLOWERS)
+        .values_list('author_id', flat=True)
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True).distinct()
+    )
+    if len(followers) >= settings.POSTS_CELEBRITY_FOLLOWERS:
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя все посты автора после подписки."""
+    if not is_celebrity(author_id):
+        _copy_posts(user_id, author_id)
+
+
+def _copy_posts(user_id, author_id):
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .values_list('pk', 'pub_date')
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты читателя после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def demote(author_id):
+    """Автор перестал быть знаменитостью: его посты снова рассылаются.
+
+    Ленты всех подписчиков заполняются одним INSERT … SELECT: число
+    запросов не зависит ни от подписчиков, ни от постов автора.
+    """
+    ops = connection.ops
+    entries = ops.quote_name(TimelineEntry._meta.db_table)
+    follows = ops.quote_name(Follow._meta.db_table)
+    posts = ops.quote_name(Post._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} {entries} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT DISTINCT follow.user_id, post.id, post.author_id, '
+            f'post.pub_date FROM {follows} follow '
+            f'JOIN {posts} post ON post.author_id = follow.author_id '
+            'WHERE follow.author_id = %s'
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [author_id]
+        )
+
+
+def rebuild(users=None):
+    """Пересобирает ленты с нуля по текущим подпискам."""
+    entries = TimelineEntry.objects.all()
+    follows = Follow.objects.all()
+    if users is not None:
+        entries = entries.filter(user__in=users)
+        follows = follows.filter(user__in=users)
+    pairs = list(follows.values_list('user_id', 'author_id').distinct())
+    celebrities = celebrity_ids({author_id for _, author_id in pairs})
+    with transaction.atomic():
+        entries.delete()
+        for user_id, author_id in pairs:
+            if author_id not in celebrities:
+                _copy_posts(user_id, author_id)
+
+
+class MergedFeed:
+    """Слияние нескольких упорядоченных потоков в один по pub_date.
+
+    Поддерживает то подмножество API QuerySet, которым пользуются
+    `Paginator` и `CursorPaginator`: filter, order_by, count и срезы.
+    Потоки не должны пересекаться.
+    """
+
+    def __init__(self, *streams, ordering=FEED_ORDERING):
+        self.ordering = ordering
+        self.streams = tuple(stream.order_by(*ordering) for stream in streams)
+
+    def filter(self, *args, **kwargs):
+        return MergedFeed(
+            *(stream.filter(*args, **kwargs) for stream in self.streams),
+            ordering=self.ordering
+        )
+
+    def order_by(self, *ordering):
+        return MergedFeed(*self.streams, ordering=ordering)
+
+    def count(self):
+        return sum(stream.count() for stream in self.streams)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        fields = [field.lstrip('-') for field in self.ordering]
+        merged = heapq.merge(
+            *(stream[:stop] for stream in self.streams),
+            key=attrgetter(*fields),
+            reverse=self.ordering[0].startswith('-'),
+        )
+        return list(islice(merged, start, stop))
+
+
+def follow_feed(user):
+    """Лента подписок: рассылаемые посты из TimelineEntry и читаемые
+    на лету посты знаменитостей, слитые по дате публикации."""
+    followed = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True
+    )
+    celebrities = celebrity_ids(followed)
+    pushed = (
+        TimelineEntry.objects.filter(user=user)
+        .exclude(author_id__in=celebrities)
+        .only('pub_date', 'post_id')
+    )
+    pulled = (
+        Post.objects.filter(author_id__in=celebrities)
+        .annotate(post_id=F('pk'))
+        .only('pub_date')
+    )
+    return MergedFeed(pushed, pulled)
+
+
+def timeline_posts(entries):
+    """Подменяет записи ленты постами, сохраняя порядок."""
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [entry.post_id for entry in entries]
+    )
+    return [posts[entry.post_id] for entry in entries
+            if entry.post_id in posts]
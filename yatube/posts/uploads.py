@@ -0,0 +1,136 @@
+import warnings
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    StopFutureHandlers, TemporaryFileUploadHandler
+)
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+# Сколько начальных байт файла разбирать в поисках размеров картинки.
+# У JPEG перед размерами бывает EXIF с превью, до 64 КБ.
+HEADER_LIMIT = 256 * 2 ** 10
+
+
+def limits_error(width, height):
+    """Сообщение об ошибке, если картинка больше допустимой, иначе None."""
+    if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+        megapixels = settings.POSTS_IMAGE_MAX_PIXELS / 10 ** 6
+        return f'Картинка больше {megapixels:g} мегапикселей.'
+    return None
+
+
+def bytes_error():
+    megabytes = settings.POSTS_IMAGE_MAX_BYTES / 2 ** 20
+    return f'Файл больше {megabytes:g} МБ.'
+
+
+def header_size(header):
+    """Размеры картинки по началу файла или None, если их там нет.
+
+    Image.open читает только заголовок, пиксели не декодируются.
+    """
+    with warnings.catch_warnings():
+        # Размеры проверяет limits_error, предупреждение Pillow не нужно.
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        try:
+            with Image.open(BytesIO(header)) as image:
+                return image.size
+        except Image.DecompressionBombError:
+            # Pillow сам отказался открывать: картинка заведомо велика.
+            return (float('inf'), 1)
+        except Exception:
+            return None
+
+
+class RejectedUpload(UploadedFile):
+    """Отклонённый при загрузке файл: вместо содержимого — причина."""
+
+    def __init__(self, name, error):
+        super().__init__(BytesIO(), name, size=0)
+        self.error = error
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет картинку из поля field_name сразу во временный файл.
+
+    Загрузка прекращается, как только файл превысил
+    POSTS_IMAGE_MAX_BYTES или заголовок показал больше
+    POSTS_IMAGE_MAX_PIXELS пикселей: остаток тела запроса дочитывается
+    впустую, ни в память, ни на диск он не попадает. Вместо файла
+    форма получает RejectedUpload с причиной. Остальные файлы
+    передаются следующим обработчикам.
+    """
+
+    def __init__(self, request=None, field_name='image'):
+        super().__init__(request)
+        self.image_field = field_name
+        self.active = False
+
+    def new_file(self, field_name, *args, **kwargs):
+        self.active = field_name == self.image_field
+        if not self.active:
+            return
+        super().new_file(field_name, *args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.error = None
+        # Остальные обработчики не заводят для картинки свои файлы.
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if self.error is not None:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POSTS_IMAGE_MAX_BYTES:
+            return self.reject(bytes_error())
+        if self.header is not None:
+            self.header += raw_data
+            size = header_size(self.header)
+            if size is not None:
+                self.header = None
+                error = limits_error(*size)
+                if error is not None:
+                    return self.reject(error)
+            elif len(self.header) >= HEADER_LIMIT:
+                # Размеры не нашлись: формат проверит ImageField формы.
+                self.header = None
+        self.file.write(raw_data)
+        return None
+
+    def reject(self, error):
+        self.error = error
+        self.header = None
+        # Временный файл удаляется при закрытии.
+        self.file.close()
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+        if self.error is not None:
+            return RejectedUpload(self.file_name, self.error)
+        return super().file_complete(file_size)
+
+
+def image_uploads(view):
+    """Принимать картинку постов через ImageUploadHandler.
+
+    Обработчики загрузки нельзя менять после чтения request.POST, а его
+    читает CsrfViewMiddleware. Поэтому CSRF проверяется уже здесь,
+    после подмены обработчиков, как советует документация Django.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, ImageUploadHandler(request))
+        return protected(request, *args, **kwargs)
+    return wrapper
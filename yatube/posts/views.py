@@ -1,25 +1,48 @@
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified,
+    JsonResponse,
+)
 from django.shortcuts import redirect, render, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
-
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags, urlencode
 
+from core.budgets import query_budget
+from core.caching import versioned_cache_page
+from . import autocomplete as prefix_index, resize
+from .search import SearchResults
+from .caching import group_scopes, index_scopes, profile_scopes
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import Comment, Group, Post, User, Follow
+from .paginators import CursorPaginator
+from .timelines import follow_feed, timeline_posts
+from .uploads import image_uploads
 
 NUMBER_POSTS_PER_PAGE = 10
+NUMBER_COMMENTS_PER_PAGE = 20
 
 
-def create_paginnator(request, post_list, posts_count):
+def create_paginnator(request, post_list, posts_count, tiebreak='pk'):
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if settings.POSTS_CURSOR_PAGINATION or after or before:
+        paginator = CursorPaginator(post_list, posts_count, tiebreak=tiebreak)
+        return paginator.get_page(after=after, before=before)
     paginator = Paginator(post_list, posts_count)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
-@cache_page(20, key_prefix='index_page')
+@query_budget(5)
+@versioned_cache_page(
+    settings.POSTS_PAGE_CACHE_TIMEOUT, 'index_page', index_scopes
+)
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.all()
+    post_list = Post.objects.select_related('author', 'group')
     page_obj = create_paginnator(request, post_list, NUMBER_POSTS_PER_PAGE)
     context = {
         'page_obj': page_obj,
@@ -27,11 +50,48 @@ def index(request):
     return render(request, template, context)
 
 
+@query_budget(6)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), NUMBER_POSTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        # Ссылки пагинатора сохраняют запрос.
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def _autocomplete_url(item):
+    if item['type'] == 'user':
+        return reverse('posts:profile', args=[item['username']])
+    return reverse('posts:group_list', args=[item['slug']])
+
+
+@query_budget(2)
+def autocomplete(request):
+    """Подсказки для строки поиска: пользователи и группы, чьи имена
+    начинаются с q. Ищет по индексу в памяти процесса, без запросов к
+    базе, пока пользователи и группы не менялись."""
+    results = prefix_index.search(request.GET.get('q', ''))
+    return JsonResponse({'results': [
+        dict(item, url=_autocomplete_url(item)) for item in results
+    ]})
+
+
+@query_budget(6)
+@versioned_cache_page(
+    settings.POSTS_PAGE_CACHE_TIMEOUT, 'group_page', group_scopes
+)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
 
-    post_list = Post.objects.select_related('group').filter(group=group)
+    post_list = Post.objects.select_related('author', 'group').filter(
+        group=group
+    )
     page_obj = create_paginnator(request, post_list, NUMBER_POSTS_PER_PAGE)
 
     context = {
@@ -41,30 +101,33 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@query_budget(7)
+@versioned_cache_page(
+    settings.POSTS_PAGE_CACHE_TIMEOUT, 'profile_page', profile_scopes
+)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = Post.objects.select_related('author').filter(author=author)
-    page_obj = create_paginnator(request, post_list, NUMBER_POSTS_PER_PAGE)
-    following = (
-        (request.user.is_authenticated) and (Follow.objects.filter(
-            user=request.user,
-            author=author).exists())
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = Post.objects.select_related('author', 'group').filter(
+        author=author
     )
+    page_obj = create_paginnator(request, post_list, NUMBER_POSTS_PER_PAGE)
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(5)
 def post_detail(request, post_id):
     post = get_object_or_404(
-        Post.objects.select_related('group', 'author'),
+        Post.objects.select_related('group', 'author', 'author__stats'),
         pk=post_id
     )
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = comments_page(post.pk, request.GET.get('comments_after'))
     context = {
         'post': post,
         'form': form,
@@ -73,7 +136,36 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_page(post_id, after=None):
+    """Страница комментариев поста с авторами, от новых к старым.
+
+    Курсорная пагинация по (created, id) — один запрос на страницу
+    при любом числе комментариев.
+    """
+    comments = Comment.objects.select_related('author').filter(
+        post_id=post_id
+    )
+    paginator = CursorPaginator(
+        comments, NUMBER_COMMENTS_PER_PAGE, field='created'
+    )
+    return paginator.get_page(after=after)
+
+
+@query_budget(2)
+def post_comments(request, post_id):
+    """Следующая страница комментариев фрагментом HTML для подгрузки
+    на странице поста."""
+    context = {
+        'post_id': post_id,
+        'comments': comments_page(post_id, request.GET.get('after')),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+# С картинкой добавляются запросы к ImageBlob.
+@query_budget(20)
 @login_required
+@image_uploads
 def post_create(request):
     if request.method == 'POST':
         form = PostForm(
@@ -98,7 +190,9 @@ def post_create(request):
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(20)
 @login_required
+@image_uploads
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -120,6 +214,7 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(8)
 @login_required
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
@@ -132,16 +227,23 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(8)
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = create_paginnator(request, post_list, NUMBER_POSTS_PER_PAGE)
+    feed = follow_feed(request.user)
+    page_obj = create_paginnator(
+        request, feed, NUMBER_POSTS_PER_PAGE, tiebreak='post_id'
+    )
+    page_obj.object_list = timeline_posts(page_obj.object_list)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/follow.html', context)
 
 
+# Подписка копирует посты автора в ленту читателя пачками по
+# timelines.BATCH_SIZE: бюджет рассчитан на авторов до ~2000 постов.
+@query_budget(20)
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
@@ -150,9 +252,57 @@ def profile_follow(request, username):
     return redirect('posts:profile', username)
 
 
+# Follow не уникальна: сигналы срабатывают на каждую удалённую запись.
+@query_budget(25)
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     follower = Follow.objects.filter(user=request.user, author=author)
     follower.delete()
     return redirect('posts:profile', username)
+
+
+@query_budget(0)
+def resized_image(request, signature, spec, name):
+    """Уменьшенная картинка поста по подписанному URL (см. resize.url).
+
+    Вариант создаётся при первом запросе и хранится в дисковом кеше.
+    Содержимое по URL не меняется, поэтому ответ кешируется навсегда.
+    """
+    params = resize.parse_spec(spec)
+    if params is None or not constant_time_compare(
+        signature, resize.signature(spec, name)
+    ):
+        raise Http404
+    try:
+        key = resize.etag(name, spec)
+    except OSError:
+        raise Http404
+    etag = f'"{key}"'
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        response = _resized_response(name, params, key)
+    response['ETag'] = etag
+    response['Cache-Control'] = resize.CACHE_CONTROL
+    return response
+
+
+def _resized_response(name, params, key):
+    format_ = params[3]
+    content_type = resize.CONTENT_TYPES[format_]
+    cache = resize.disk_cache()
+    path = cache.get(key, format_)
+    if path is not None:
+        try:
+            return FileResponse(open(path, 'rb'), content_type=content_type)
+        except FileNotFoundError:
+            # Файл вытеснил другой процесс: создаём заново.
+            pass
+    try:
+        content = resize.render(name, *params)
+    except OSError:
+        raise Http404
+    cache.set(key, format_, content)
+    return HttpResponse(content, content_type=content_type)
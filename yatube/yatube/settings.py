@@ -50,6 +50,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilerMiddleware',
+    'core.slowqueries.SlowQueryMiddleware',
+    'core.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,6 +92,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Сохранение и сдвиг счётчиков в сигналах (posts/signals.py)
+        # фиксируются вместе: сбой посреди запроса не оставит счётчик
+        # разошедшимся с данными.
+        'ATOMIC_REQUESTS': True,
     }
 }
 
@@ -143,8 +150,111 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Двухуровневый кеш: LRU в памяти процесса перед общим кешем 'shared'.
+# LocMemCache у каждого процесса свой: при нескольких воркерах сброс
+# версий страниц не доходит до соседей. В бою 'shared' должен быть
+# общим — Redis, Memcached или не требующий сервиса
+# core.backends.sqlite.SQLiteCache:
+#     'BACKEND': 'core.backends.sqlite.SQLiteCache',
+#     'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+#     'OPTIONS': {'MAX_ENTRIES': 100000},
 CACHES = {
     'default': {
+        'BACKEND': 'core.backends.tiered.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+        },
+    },
+    'shared': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+}
+
+# Курсорная пагинация лент (?after=/?before=) вместо номеров страниц.
+# Ссылки с курсором работают и при выключенной настройке.
+POSTS_CURSOR_PAGINATION = False
+
+# Посты авторов, у которых подписчиков не меньше порога, не рассылаются
+# по лентам (TimelineEntry), а подмешиваются в follow_index при чтении.
+POSTS_CELEBRITY_FOLLOWERS = 1000
+
+# Страницы лент кешируются надолго: устаревают они по событиям
+# (см. posts/caching.py), а не по таймеру.
+POSTS_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# Карточки постов (posts/includes/post_list.html) в кеше фрагментов.
+POSTS_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Миниатюры картинок постов: имя -> (геометрия, параметры sorl-thumbnail).
+# Создаются при сохранении поста, до тех пор выводится оригинал.
+POSTS_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+# Адаптивные варианты каждой миниатюры для srcset: ширины и форматы.
+# Формат пропускается, если его не умеют Pillow или sorl-thumbnail
+# (AVIF в sorl-thumbnail 12.7 не поддерживается).
+POSTS_THUMBNAIL_WIDTHS = (480, 960, 1920)
+POSTS_THUMBNAIL_FORMATS = ('AVIF', 'WEBP')
+
+# Ограничения на картинки постов. Загрузка обрывается, как только файл
+# превысил размер или заголовок картинки показал больше пикселей.
+POSTS_IMAGE_MAX_BYTES = 10 * 2 ** 20
+POSTS_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+
+# Потоков, создающих миниатюры в фоне; 0 — создавать сразу при сохранении.
+POSTS_THUMBNAIL_WORKERS = 2
+
+# По умолчанию миниатюры — готовые файлы sorl-thumbnail: их создают
+# фоновые потоки (POSTS_THUMBNAIL_WORKERS), страница находит их одним
+# lookup_many, варианты AVIF и WebP попадают в srcset. True — миниатюры
+# отдаёт posts.views.resized_image по подписанным URL /img/...: файл
+# создаётся при первом запросе, при рендере страницы ничего не ищется.
+# Само представление работает при любом значении, чтобы уже выданные
+# URL не ломались при переключении.
+POSTS_THUMBNAIL_VIEW = False
+# Дисковый кеш вариантов: сверх этого размера вытесняются давно не
+# читанные.
+POSTS_RESIZE_CACHE_DIR = os.path.join(BASE_DIR, 'resized')
+POSTS_RESIZE_CACHE_MAX_BYTES = 512 * 2 ** 20
+# Наибольшая ширина и высота варианта.
+POSTS_RESIZE_MAX_SIZE = 4096
+
+# Бюджеты SQL-запросов представлений (core.budgets.query_budget): при
+# превышении 'raise' — исключение, 'log' — предупреждение в лог,
+# None — запросы не считаются. Тесты запускаются с DEBUG=False, но
+# значение вычислено здесь, поэтому в них бюджеты тоже проверяются.
+QUERY_BUDGET_ACTION = 'raise' if DEBUG else 'log'
+
+# Заголовок Server-Timing и строка лога core.timing со временем SQL,
+# шаблонов, миниатюр и кеша для каждого запроса. Выключенный middleware
+# не участвует в обработке запросов.
+SERVER_TIMING = False
+
+# Профилирование отдельных запросов по токену сотрудника (страница
+# /debug/profiles/): файлы cProfile, хранятся только самые новые.
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILER_MAX_FILES = 50
+PROFILER_TOKEN_MAX_AGE = 60 * 60
+
+# Запросы к базе дольше порога (мс) пишутся в лог core.slowqueries и
+# строками JSON в SLOW_QUERY_LOG; сводка — manage.py slow_queries.
+# None — не замерять.
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow_queries.jsonl')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
@@ -15,6 +15,7 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
 
     path('admin/', admin.site.urls),
+    path('debug/', include('core.urls', namespace='core')),
 ]
 handler403 = 'core.views.csrf_failure'
 handler404 = 'core.views.page_not_found'